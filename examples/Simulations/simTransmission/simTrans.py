@@ -11,25 +11,15 @@ def main(config_file='config.ini', energy_min=1, energy_max=100, energy_points=1
     # Generate a linear energy grid
     energy_grid = np.linspace(energy_min, energy_max, energy_points)
     
-    # Create a list for the transmission data for each isotope
-    transmissions = []
+    # Calculate the transmission of each isotope and of the whole sample
+    transmissions, combined_transmission = psd.calculate_transmission_matrix(energy_grid, isotopes)
     
     # Create a figure and axis
     fig, ax = plt.subplots(1,1)
     
-    # Loop over all isotopes in isotope_info.isotopes
-    for isotope in isotopes:
-        
-        # Generate transmission data
-        transmission_data = psd.create_transmission(energy_grid,isotope)
-        grid_energies, interp_transmission = zip(*transmission_data)
-        transmissions.append(interp_transmission)
-        
-        # Plot the transmission data
-        ax.semilogx(grid_energies, interp_transmission, alpha=0.75, label=isotope.name)
-    
-    #combine transmissions for all isotopes
-    combined_transmission = np.prod(transmissions, axis=0)
+    # Plot the transmission data of each isotope
+    for isotope, interp_transmission in zip(isotopes, transmissions):
+        ax.semilogx(energy_grid, interp_transmission, alpha=0.75, label=isotope.name)
     
     # Plot the combined transmission data
     ax.semilogx(energy_grid, combined_transmission, color='black', alpha=0.75, linestyle='dashed', label="Total")
@@ -44,7 +34,7 @@ def main(config_file='config.ini', energy_min=1, energy_max=100, energy_points=1
         output_file_name = config_file.split(".")[0]+".twenty"
         
         # Write the transmission data to a file, do not include error. 
-        psd.write_transmission_data(grid_energies,combined_transmission,output_file_name, include_error=True, verbose=True)
+        psd.write_transmission_data(energy_grid,combined_transmission,output_file_name, include_error=True, verbose=True)
     
 
 
@@ -0,0 +1,260 @@
+import os
+import pathlib
+import pickle
+import re
+from functools import lru_cache
+import numpy as np
+
+from pleiades import nucData
+
+# current file location
+PWD = pathlib.Path(__file__).parent
+
+# default location of the ENDF resonance library
+ENDF_FILE = PWD.parent / "nucDataLibs/resonanceTables/res_endf8.endf"
+
+# bump INDEX_VERSION whenever the layout of the cached MAT index changes
+INDEX_VERSION = 1
+
+# resonance formalisms (LRF) of resolved ranges understood by read_resonances
+RESONANCE_FORMALISMS = {1: "SLBW", 2: "MLBW", 3: "Reich-Moore"}
+
+
+def _control(line):
+    """ Returns the MAT, MF and MT numbers of an ENDF line (columns 67-75).
+
+    Args:
+        line (bytes): line of an ENDF file
+
+    Returns:
+        tuple: MAT, MF and MT numbers, None if the line has no control numbers
+    """
+    try:
+        return int(line[66:70]), int(line[70:72]), int(line[72:75])
+    except ValueError:
+        return None
+
+
+def build_mat_index(filename=ENDF_FILE):
+    """ Scans an ENDF tape and records the byte range of every material.
+
+    The range of a material starts at its first line and ends after the MEND record that closes it.
+
+    Args:
+        filename (string): ENDF file location
+
+    Returns:
+        dict: (start, stop) byte offsets keyed by MAT number, and the tape header line under the key "header"
+    """
+    index = {}
+    current, start, offset = None, 0, 0
+    with open(filename, "rb") as fid:
+        header = fid.readline()
+        offset = len(header)
+        index["header"] = header.decode()
+        for line in fid:
+            control = _control(line)
+            mat = control[0] if control else None
+            if mat != current:
+                if current not in (None, 0, -1) and mat == 0:
+                    # MEND record, the material ends after this line
+                    index[current] = (start, offset + len(line))
+                elif mat not in (None, 0, -1):
+                    start = offset
+                current = mat
+            offset += len(line)
+    return index
+
+
+@lru_cache(maxsize=None)
+def _cached_mat_index(filename, mtime_ns, size):
+    index_file = pathlib.Path(f"{filename}.matindex")
+    signature = (filename, mtime_ns, size)
+    try:
+        with open(index_file, "rb") as fid:
+            cache = pickle.load(fid)
+        if cache.get("version") == INDEX_VERSION and cache.get("signature") == signature:
+            return cache["index"]
+    except Exception:
+        # a missing, corrupt or outdated index is simply rebuilt
+        pass
+
+    index = build_mat_index(filename)
+    nucData.write_atomic(index_file, lambda fid: pickle.dump({"version": INDEX_VERSION, "signature": signature, "index": index}, fid))
+    return index
+
+
+def get_mat_index(filename=ENDF_FILE):
+    """ Returns the MAT index of an ENDF tape (see build_mat_index).
+
+    The index is built once per version of the file and cached next to it in '{filename}.matindex'.
+
+    Args:
+        filename (string): ENDF file location
+
+    Returns:
+        dict: (start, stop) byte offsets keyed by MAT number, and the tape header line under the key "header"
+    """
+    filename = pathlib.Path(filename).resolve()
+    stat = os.stat(filename)
+    return _cached_mat_index(str(filename), stat.st_mtime_ns, stat.st_size)
+
+
+def read_mat(mat, filename=ENDF_FILE):
+    """ Reads the section of a single material from an ENDF tape.
+
+    Args:
+        mat (int): ENDF MAT number
+        filename (string): ENDF file location
+
+    Raises:
+        KeyError: If the material is not in the file
+
+    Returns:
+        bytes: the lines of the material, including its MEND record
+    """
+    index = get_mat_index(filename)
+    if mat not in index:
+        raise KeyError(f"MAT={mat} is not found in {filename}")
+    start, stop = index[mat]
+    with open(filename, "rb") as fid:
+        fid.seek(start)
+        return fid.read(stop - start)
+
+
+def extract_mat(mat, output_file, filename=ENDF_FILE):
+    """ Writes a self-contained ENDF tape holding a single material.
+
+    The tape consists of the header line of the library, the material and a TEND record.
+
+    Args:
+        mat (int): ENDF MAT number
+        output_file (string): location of the tape to write
+        filename (string): ENDF file location
+
+    Raises:
+        KeyError: If the material is not in the file
+
+    Returns:
+        pathlib.Path: the location of the written tape
+    """
+    section = read_mat(mat, filename)
+    output_file = pathlib.Path(output_file)
+    # never write through a link to the library itself
+    if output_file.is_symlink():
+        output_file.unlink()
+    with open(output_file, "wb") as fid:
+        fid.write(get_mat_index(filename)["header"].encode())
+        fid.write(section)
+        fid.write(f"{'':66s}{-1:4d}{0:2d}{0:3d}{0:5d}\n".encode())
+    return output_file
+
+
+def endf_float(text):
+    """ Converts an ENDF number field to a float.
+
+    ENDF (and SAMMY par files) write floats without the exponent letter, e.g. "1.234567+5" or "-2.5-3".
+    Blank fields are zero.
+
+    Args:
+        text (string): 11 character field of an ENDF line
+
+    Returns:
+        float: the value of the field
+    """
+    text = text.strip()
+    if not text:
+        return 0.
+    return float(re.sub(r"(?<=[0-9.])([+-])", r"e\1", text))
+
+
+class _Records:
+    """ Reads the records (CONT, LIST, TAB1) of an ENDF section line by line. """
+    def __init__(self, lines):
+        self._lines = iter(lines)
+
+    def _fields(self):
+        line = next(self._lines)
+        return [line[start:start+11] for start in range(0, 66, 11)]
+
+    def cont(self):
+        """Returns C1, C2, L1, L2, N1, N2 of a CONT (or HEAD) record."""
+        fields = self._fields()
+        return (endf_float(fields[0]), endf_float(fields[1]), *[int(endf_float(field)) for field in fields[2:]])
+
+    def values(self, count):
+        """Returns the next count values, six per line."""
+        values = []
+        while len(values) < count:
+            values += [endf_float(field) for field in self._fields()]
+        return values[:count]
+
+    def list(self):
+        """Returns the header and the values of a LIST record."""
+        header = self.cont()
+        return header, self.values(header[4])
+
+    def tab1(self):
+        """Returns the header of a TAB1 record and skips its interpolation table and values."""
+        header = self.cont()
+        self.values(2*header[4])
+        self.values(2*header[5])
+        return header
+
+
+def read_resonances(mat, filename=ENDF_FILE):
+    """ Reads the resolved resonance parameters (MF=2, MT=151) of a material.
+
+    Single- and multi-level Breit-Wigner (LRF=1,2) and Reich-Moore (LRF=3) ranges are read. Ranges that
+    hold only a scattering radius are skipped, and reading stops at the first unresolved range.
+
+    Args:
+        mat (int): ENDF MAT number
+        filename (string): ENDF file location
+
+    Raises:
+        KeyError: If the material is not in the file
+        ValueError: If the section is missing or uses an unsupported formalism
+
+    Returns:
+        dict: ZA, AWR and a list of "isotopes", each with ZAI, abundance and a list of resolved "ranges".
+              A range holds EL, EH, LRF, formalism, NAPS, SPI, AP (fm) and a list of "l_values", each
+              with L, AWRI, APL (fm) and the (NRS,6) "resonances" rows of the ENDF LIST record.
+    """
+    lines = [line for line in read_mat(mat, filename).decode().splitlines()
+             if _control(line.encode()) is not None and _control(line.encode())[1:] == (2, 151)]
+    if not lines:
+        raise ValueError(f"MAT={mat} in {filename} has no resonance parameters (MF=2, MT=151)")
+
+    records = _Records(lines)
+    ZA, AWR, _, _, NIS, _ = records.cont()
+    resonances = {"ZA": int(ZA), "AWR": AWR, "isotopes": []}
+
+    for _ in range(NIS):
+        ZAI, ABN, _, LFW, NER, _ = records.cont()
+        isotope = {"ZAI": int(ZAI), "abundance": ABN, "ranges": []}
+        resonances["isotopes"].append(isotope)
+
+        for _ in range(NER):
+            EL, EH, LRU, LRF, NRO, NAPS = records.cont()
+            if LRU == 2:
+                # unresolved ranges follow the resolved ones
+                return resonances
+            if LRU == 1 and LRF not in RESONANCE_FORMALISMS:
+                raise ValueError(f"MAT={mat}: resonance formalism LRF={LRF} is not supported")
+            if NRO != 0:
+                # energy dependent scattering radius, the constant AP below is used
+                records.tab1()
+
+            SPI, AP, _, _, NLS, _ = records.cont()
+            resolved_range = {"EL": EL, "EH": EH, "LRF": LRF, "formalism": RESONANCE_FORMALISMS.get(LRF),
+                              "NAPS": NAPS, "SPI": SPI, "AP": 10*AP, "l_values": []}
+            for _ in range(NLS if LRU == 1 else 0):
+                (AWRI, APL, L, _, _, NRS), values = records.list()
+                resolved_range["l_values"].append({"L": L, "AWRI": AWRI,
+                                                   "APL": 10*APL if LRF == 3 else 0.,
+                                                   "resonances": np.array(values).reshape(NRS, 6)})
+            if resolved_range["l_values"]:
+                isotope["ranges"].append(resolved_range)
+
+    return resonances
@@ -2,10 +2,25 @@ import numpy as np
 import os
 import pathlib
 import re
+import pickle
+import tempfile
+from functools import lru_cache
 
 # current file location
 PWD = pathlib.Path(__file__).parent
 
+# default locations of the isotope information tables
+AME_FILE = PWD.parent / "nucDataLibs/isotopeInfo/mass.mas20"
+ISOTOPES_INFO_FILE = PWD.parent / "nucDataLibs/isotopeInfo/isotopes.info"
+NEUTRONS_LIST_FILE = PWD.parent / "nucDataLibs/isotopeInfo/neutrons.list"
+
+NEUTRON_MASS = 1.00866491595           # neutron mass in amu
+ATOMIC_MASS_UNIT_EV = 931.49410242E6    # atomic mass unit in eV/c^2
+
+# binary cache of the parsed tables, bump CACHE_VERSION whenever the parsed layout changes
+CACHE_FILE = PWD.parent / "nucDataLibs/isotopeInfo/isotopeInfo.cache"
+CACHE_VERSION = 2
+
 def extract_isotope_info(filename, isotope):
     """This function extracts the spin and abundance of an isotope from the file isotope.info.
 
@@ -17,21 +32,10 @@ def extract_isotope_info(filename, isotope):
     Returns:
         tuple: spin and natural abundance of the isotope
     """
-    with open(filename, 'r') as file:
-        lines = file.readlines()
-        for line in lines:
-            line = line.strip()  # Remove leading/trailing whitespaces
-            if line and line[0].isdigit():  # Check if the line contains isotope data
-                data = line.split()  # Split the line into columns based on spaces
-                
-                symbol = data[3]  # Extract the element symbol
-                numOfNucleons = data[1]  # Extract the number of nucleons
-                
-                if isotope == f"{symbol}-{numOfNucleons}":  # Check if the isotope matches
-                    spin = data[5]
-                    abundance = data[7]
-                    return spin, abundance
-    return None, None
+    row = get_database(isotopes_file=filename).isotope_info(isotope)
+    if row is None:
+        return None, None
+    return row[5], row[7]
 
 def parse_ame_line(line):
     """ Takes a line from the AME file and parses it into its constituent values.
@@ -95,6 +99,77 @@ def parse_ame_line(line):
     }
 
 
+# fixed-width columns of the AME mass table (same positions as parse_ame_line)
+_AME_INT_COLUMNS = {"NZ": slice(2,5), "N": slice(5,9), "Z": slice(9,14), "A": slice(14,19)}
+_AME_STR_COLUMNS = {"cc": slice(0,1), "el": slice(20,23), "o": slice(23,27), "B": slice(79,81)}
+_AME_FLOAT_COLUMNS = {"mass": slice(28,42),
+                      "mass_unc": slice(42,54),
+                      "binding": slice(55,68),
+                      "bind_unc": slice(69,79),
+                      "beta": slice(82,93),
+                      "beta_unc": slice(95,106),
+                      "atomic_mass_unc": slice(124,136)}
+
+AME_DTYPE = np.dtype([("cc", "U1"), ("NZ", int), ("N", int), ("Z", int), ("A", int),
+                      ("el", "U3"), ("o", "U4"),
+                      ("mass", float), ("mass_unc", float),
+                      ("binding", float), ("bind_unc", float),
+                      ("B", "U2"), ("beta", float), ("beta_unc", float),
+                      ("atomic_mass", float), ("atomic_mass_unc", float)])
+
+
+def read_ame_table(filename: str = AME_FILE, skip_header: int = 36) -> np.ndarray:
+    """Reads the whole AME mass table into a NumPy structured array in one vectorized fixed-width pass
+
+    The '#' (estimated value in place of the decimal point) and '*' (not calculable) conventions are
+    handled as in parse_ame_line: '#' values are read as numbers and '*' values become NaN.
+
+    Args:
+        filename (str, optional): AME mass table (mass.mas20) location
+        skip_header (int, optional): number of header lines to skip. Defaults to 36.
+
+    Returns:
+        np.ndarray: structured array with the fields of AME_DTYPE, one row per line of the table
+    """
+    with open(filename, "rb") as f:
+        lines = f.read().splitlines()[skip_header:]
+
+    # fixed-width character matrix, short lines are padded with blanks
+    width = max(136, max(len(line) for line in lines))
+    chars = np.array(lines, dtype=f"S{width}").view(np.uint8).reshape(len(lines), width).copy()
+    chars[chars == 0] = ord(" ")
+    chars[chars == ord("#")] = ord(".")
+
+    def column(columns):
+        # extract a fixed-width column as a 1d array of byte strings
+        block = np.ascontiguousarray(chars[:, columns])
+        return block.view(f"S{block.shape[1]}").ravel()
+
+    def to_float(block):
+        block = block.copy()
+        blank = np.char.strip(block) == b""
+        not_calculable = np.char.find(block, b"*") >= 0
+        block[blank | not_calculable] = b"nan"
+        return block.astype(float)
+
+    table = np.empty(len(lines), dtype=AME_DTYPE)
+    for key, columns in _AME_INT_COLUMNS.items():
+        block = column(columns).copy()
+        block[np.char.strip(block) == b""] = b"0"
+        table[key] = block.astype(int)
+    for key, columns in _AME_STR_COLUMNS.items():
+        table[key] = np.char.decode(column(columns), "ascii")
+        if key != "cc":
+            table[key] = np.char.strip(table[key])
+    for key, columns in _AME_FLOAT_COLUMNS.items():
+        table[key] = to_float(column(columns))
+
+    # the atomic mass is split into a coarse (integer) and a fine (micro-u) part
+    table["atomic_mass"] = to_float(column(np.r_[106:109, 110:124]))
+
+    return table
+
+
 def get_info(isotopic_str):
     """Takes a string of the form 'element-atomicNumber' and returns the element and atomic number.
 
@@ -125,43 +200,9 @@ def get_mass_from_ame(isotopic_str: str='U-238')->float:
     Returns:
         float: the atomic mass in amu
     """
-    # import re
-    # pattern = r"\b([A-Z][a-z]?)-(\d+)\b"
-    # if not re.search(pattern,isotopic_str):
-    #     # raise ValueError(f"isotopic_str should be in the format of Element-AtomicMass (U-235)")
-        
-    
-    possible_isotopes_data_list = []
+    return get_database().mass(isotopic_str)
 
 
-    element, atomic_number = get_info(isotopic_str)
-    # Load the file into a list of lines
-    nucelar_masses_file = PWD.parent / "nucDataLibs/isotopeInfo/mass.mas20"
-    
-    with open(nucelar_masses_file, "r") as f:
-        
-        # Skip the first 36 lines of header info
-        for _ in range(36):
-            next(f)
-
-        # start searching through lines.
-        for line in f:
-            # If we find the name of the isotope and the atomic number
-            if (element in line[:25]) and (str(atomic_number) in line[:25]):
-                possible_isotopes_data = parse_ame_line(line)
-                possible_isotopes_data_list.append(possible_isotopes_data)
-
-        # If we didn't find any data for the isotope
-        if len(possible_isotopes_data_list) == 0:
-            # raise ValueError("No data found for {} in {}".format(isotopic_str, nucelar_masses_file))
-            return None 
-        # If we found more than one isotope, then we need to find the correct one. 
-        else:
-            for iso in possible_isotopes_data_list:
-                if (iso['el'] == element) and (iso['A'] == atomic_number):
-                    final_atomic_mass = iso['atomic_mass']
-                    return round(final_atomic_mass/1E6,4)     
-
 def get_mat_number(isotopic_str: str='U-238')-> int:
     """Grabs the ENDF mat number of the requested isotope
 
@@ -171,22 +212,363 @@ def get_mat_number(isotopic_str: str='U-238')-> int:
     Returns:
         int: mat number 
     """  
-    # import re
-    # pattern = r"\b([A-Z][a-z]?)-(\d+)\b"
-    # if not re.search(pattern,isotopic_str):
-    #     raise ValueError(f"isotopic_str should be in the format of Element-AtomicMass (e.g. U-238)")
+    return get_database().mat_number(isotopic_str)
+
+
+def get_masses(isotopes: list) -> np.ndarray:
+    """Returns the atomic masses from AME tables for a list of isotopes
+
+    Args:
+        isotopes (list): isotope names (e.g. ["U-235","U-238"])
+
+    Returns:
+        np.ndarray: atomic masses in amu, NaN for isotopes that are not found
+    """
+    return get_database().masses(isotopes)
+
+
+def expand_element(element: str) -> list:
+    """Expands a natural element (e.g. 'Eu', 'W') into its naturally occurring isotopes
+
+    Args:
+        element (str): element symbol
+
+    Returns:
+        list: one dict per isotope with the name, Z, A, natural abundance (fraction), mass, spin and mat number
+    """
+    return get_database().expand_element(element)
+
+
+def get_natural_abundances(element: str) -> dict:
+    """Returns the natural abundances of an element, e.g. to build a compound for sammyUtils.run_sammy_fit
+
+    Args:
+        element (str): element symbol (e.g. 'Eu')
+
+    Returns:
+        dict: isotope name keys (e.g. 'Eu-151') and natural abundance (fraction) values
+    """
+    return {isotope["name"]: isotope["abundance"] for isotope in expand_element(element)}
+
+
+def isotope_name(isotopic_str: str) -> str:
+    """Normalize an isotope string (e.g. 'U238', 'U_238', 'U-238') to the 'element-atomicNumber' form
+
+    Args:
+        isotopic_str (str): isotope name in any of the accepted forms
+
+    Returns:
+        str: normalized isotope name (e.g. 'U-238'), or an empty string if the name can not be parsed
+    """
     element, atomic_number = get_info(isotopic_str)
+    if atomic_number is None:
+        return ""
+    return f"{element}-{atomic_number}"
+
+
+def write_atomic(filename, write, mode: str = "wb") -> bool:
+    """Write a file through a temporary file in the same directory that is renamed into place, so that
+    concurrent readers see either the previous or the complete new file.
+
+    Args:
+        filename (str): file to write
+        write (callable): called with the open temporary file to write the content
+        mode (str, optional): file mode, "wb" or "w". Defaults to "wb".
+
+    Returns:
+        bool: False if the file could not be written, e.g. in a read-only directory
+    """
+    filename = pathlib.Path(filename)
+    tmpname = None
+    try:
+        fd, tmpname = tempfile.mkstemp(dir=filename.parent, suffix=".tmp")
+        with os.fdopen(fd, mode) as fid:
+            write(fid)
+        os.replace(tmpname, filename)
+        return True
+    except OSError:
+        if tmpname and os.path.exists(tmpname):
+            os.remove(tmpname)
+        return False
+
+
+class IsotopeDatabase:
+    """In-memory index of the AME mass table, isotopes.info and the ENDF neutrons.list summary.
+
+    Each table is parsed once, on first use, into dictionaries keyed by the normalized
+    isotope name ('element-atomicNumber', e.g. 'Eu-151'), so that repeated lookups of
+    masses, spins, abundances and MAT numbers do not touch the disk again.
+
+    If a cache_file is given, the parsed tables are also stored there in binary (pickle) form.
+    Each cached table is keyed on the path, mtime and size of its source file and is
+    re-parsed (and the cache rewritten) when the source changes.
+    """
+
+    def __init__(self, ame_file: str = AME_FILE,
+                       isotopes_file: str = ISOTOPES_INFO_FILE,
+                       neutrons_file: str = NEUTRONS_LIST_FILE,
+                       cache_file: str = None) -> None:
+        """
+        Args:
+            ame_file (str, optional): AME mass table (mass.mas20) location
+            isotopes_file (str, optional): isotopes.info file location
+            neutrons_file (str, optional): ENDF neutrons.list summary table location
+            cache_file (str, optional): binary cache file of the parsed tables, None disables caching
+        """
+        self.ame_file = pathlib.Path(ame_file)
+        self.isotopes_file = pathlib.Path(isotopes_file)
+        self.neutrons_file = pathlib.Path(neutrons_file)
+        self.cache_file = pathlib.Path(cache_file) if cache_file else None
+
+        self._cache = None      # content of the cache file
+
+        self._ame = None        # AME structured array
+        self._ame_index = None  # name -> row of the AME array
+        self._info = None       # name -> isotopes.info columns
+        self._mat = None        # name -> ENDF mat number
+        self._by_ZA = None      # (Z, A) -> name
+        self._by_element = None # element symbol -> isotope names in isotopes.info
+
+    @property
+    def ame(self) -> np.ndarray:
+        """np.ndarray: AME mass table as a structured array (see read_ame_table)"""
+        if self._ame is None:
+            self._ame, self._ame_index = self._load_table("ame", self.ame_file, self._read_ame_table)
+        return self._ame
+
+    @property
+    def ame_index(self) -> dict:
+        """dict: row of the AME array keyed by isotope name"""
+        if self._ame_index is None:
+            self.ame
+        return self._ame_index
+
+    @property
+    def info(self) -> dict:
+        """dict: isotopes.info columns keyed by isotope name"""
+        if self._info is None:
+            self._info = self._load_table("info", self.isotopes_file, self._read_isotopes_info)
+        return self._info
+
+    @property
+    def mat(self) -> dict:
+        """dict: ENDF mat numbers keyed by isotope name"""
+        if self._mat is None:
+            self._mat = self._load_table("mat", self.neutrons_file, self._read_neutrons_list)
+        return self._mat
+
+    def _load_table(self, key: str, source: pathlib.Path, reader) -> dict:
+        # returns the cached table if its source file did not change, otherwise parse and re-cache it
+        stat = os.stat(source)
+        signature = (str(source.resolve()), stat.st_mtime_ns, stat.st_size)
+
+        cache = self._read_cache()
+        if key in cache and cache[key][0] == signature:
+            return cache[key][1]
+
+        table = reader()
+        cache[key] = (signature, table)
+        self._write_cache()
+        return table
+
+    def _read_cache(self) -> dict:
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_file and self.cache_file.exists():
+                try:
+                    with open(self.cache_file, "rb") as fid:
+                        cache = pickle.load(fid)
+                    if cache.get("version") == CACHE_VERSION:
+                        self._cache = cache["tables"]
+                except Exception:
+                    # a corrupt or incompatible cache is simply rebuilt
+                    pass
+        return self._cache
+
+    def _write_cache(self) -> None:
+        if not self.cache_file:
+            return
+        # a read-only installation simply runs without the cache
+        write_atomic(self.cache_file, lambda fid: pickle.dump({"version": CACHE_VERSION, "tables": self._cache},
+                                                              fid, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _read_ame_table(self) -> tuple:
+        ame = read_ame_table(self.ame_file)
+        index = {}
+        for row, (element, atomic_number) in enumerate(zip(ame["el"].tolist(), ame["A"].tolist())):
+            index.setdefault(f"{element}-{atomic_number}", row)
+        return ame, index
+
+    def _read_isotopes_info(self) -> dict:
+        info = {}
+        with open(self.isotopes_file, "r") as f:
+            for line in f:
+                line = line.strip()  # Remove leading/trailing whitespaces
+                if line and line[0].isdigit():  # Check if the line contains isotope data
+                    data = line.split()  # Split the line into columns based on spaces
+                    info.setdefault(f"{data[3]}-{data[1]}", data)
+        return info
+
+    def _read_neutrons_list(self) -> dict:
+        mat = {}
+        pattern = re.compile(r'\b\s*(\d+)\s*-\s*([A-Za-z]+)\s*-\s*(\d+)([A-Za-z]*)\b') # match the isotope name
+        with open(self.neutrons_file, "r") as fid:
+            for line in fid:
+                match = pattern.search(line)
+                if match:
+                    # the mat number is a 4 digits string at the end of each line
+                    # keep the first entry, metastable states are listed after the ground state
+                    mat.setdefault(match.expand(r'\2-\3'), int(line[-5:]))
+        return mat
+
+    def by_ZA(self, Z: int, A: int) -> str:
+        """Returns the isotope name for a given proton and nucleon number
+
+        Args:
+            Z (int): number of protons
+            A (int): number of nucleons
+
+        Returns:
+            str: isotope name (e.g. 'Eu-151') or None if not found
+        """
+        if self._by_ZA is None:
+            self._by_ZA = {(int(self.ame["Z"][row]), int(self.ame["A"][row])): name for name, row in self.ame_index.items()}
+        return self._by_ZA.get((int(Z), int(A)))
+
+    def mass(self, isotopic_str: str) -> float:
+        """Returns the atomic mass from AME tables
+
+        Args:
+            isotopic_str (str): isotope name (e.g. 'Eu-153')
+
+        Returns:
+            float: the atomic mass in amu, None if the isotope is not found
+        """
+        row = self.ame_index.get(isotope_name(isotopic_str))
+        if row is None:
+            return None
+        return round(float(self.ame["atomic_mass"][row])/1E6, 4)
+
+    def masses(self, isotopes: list) -> np.ndarray:
+        """Returns the atomic masses of many isotopes at once
+
+        Args:
+            isotopes (list): isotope names (e.g. ["U-235","U-238"])
 
-    # open the file containing the endf summary table
-    with open(PWD.parent / "nucDataLibs/isotopeInfo/neutrons.list","r") as fid:
-        pattern = r'\b\s*(\d+)\s*-\s*([A-Za-z]+)\s*-\s*(\d+)([A-Za-z]*)\b' # match the isotope name 
-        for line in fid:
-            # find match for an isotope string in the line
-            match = re.search(pattern,line)
-
-            if match and match.expand(r'\2-\3')==f"{element}-{atomic_number}":
-                # the mat number is a 4 digits string at the end of each line
-                matnumber = int(line[-5:])
-                return matnumber
-                
-    raise ValueError(f"{isotopic_str} not found")                                                        
\ No newline at end of file
+        Returns:
+            np.ndarray: atomic masses in amu (rounded as in mass()), NaN for isotopes that are not found
+        """
+        rows = np.array([self.ame_index.get(isotope_name(isotope), -1) for isotope in isotopes], dtype=int)
+        masses = np.round(self.ame["atomic_mass"][rows]/1E6, 4)
+        masses[rows < 0] = np.nan
+        return masses
+
+    def isotope_info(self, isotopic_str: str) -> list:
+        """Returns the isotopes.info columns of an isotope
+
+        Args:
+            isotopic_str (str): isotope name (e.g. 'Eu-153')
+
+        Returns:
+            list: the split line of isotopes.info, None if the isotope is not found
+        """
+        return self.info.get(isotope_name(isotopic_str))
+
+    def spin(self, isotopic_str: str) -> float:
+        """Returns the nuclear spin of an isotope
+
+        Args:
+            isotopic_str (str): isotope name (e.g. 'Eu-153')
+
+        Returns:
+            float: spin quantum number, None if the isotope is not found
+        """
+        row = self.isotope_info(isotopic_str)
+        return float(row[5]) if row else None
+
+    def abundance(self, isotopic_str: str) -> float:
+        """Returns the natural abundance of an isotope
+
+        Args:
+            isotopic_str (str): isotope name (e.g. 'Eu-153')
+
+        Returns:
+            float: natural abundance in percent, None if the isotope is not found
+        """
+        row = self.isotope_info(isotopic_str)
+        return float(row[7]) if row else None
+
+    def mat_number(self, isotopic_str: str) -> int:
+        """Returns the ENDF mat number of an isotope
+
+        Args:
+            isotopic_str (str): isotope name (e.g. 'U-238')
+
+        Raises:
+            ValueError: if the isotope is not found in the ENDF summary table
+
+        Returns:
+            int: mat number
+        """
+        try:
+            return self.mat[isotope_name(isotopic_str)]
+        except KeyError:
+            raise ValueError(f"{isotopic_str} not found")
+
+    def expand_element(self, element: str) -> list:
+        """Expands a natural element into its naturally occurring isotopes
+
+        Args:
+            element (str): element symbol (e.g. 'Eu', 'W')
+
+        Raises:
+            ValueError: if the element is not found in isotopes.info
+
+        Returns:
+            list: one dict per isotope with the keys 'name', 'Z', 'A', 'abundance' (fraction),
+                  'mass' (amu), 'spin' and 'mat' (None if the isotope has no ENDF evaluation)
+        """
+        if self._by_element is None:
+            self._by_element = {}
+            for name, row in self.info.items():
+                self._by_element.setdefault(row[3], []).append(name)
+
+        symbol = element.strip().capitalize()
+        if symbol not in self._by_element:
+            raise ValueError(f"{element} not found")
+
+        rows = [self.info[name] for name in self._by_element[symbol] if float(self.info[name][7]) > 0]
+        names = [f"{row[3]}-{row[1]}" for row in rows]
+        masses = self.masses(names)
+
+        return [{"name": name,
+                 "Z": int(row[0]),
+                 "A": int(row[1]),
+                 "abundance": float(row[7])/100.,
+                 "mass": float(mass),
+                 "spin": float(row[5]),
+                 "mat": self.mat.get(name)} for name, row, mass in zip(names, rows, masses)]
+
+
+@lru_cache(maxsize=None)
+def _cached_database(ame_file: str, isotopes_file: str, neutrons_file: str, cache_file: str) -> IsotopeDatabase:
+    return IsotopeDatabase(ame_file, isotopes_file, neutrons_file, cache_file)
+
+
+def get_database(ame_file: str = AME_FILE,
+                 isotopes_file: str = ISOTOPES_INFO_FILE,
+                 neutrons_file: str = NEUTRONS_LIST_FILE,
+                 cache_file: str = CACHE_FILE) -> IsotopeDatabase:
+    """Returns the process-wide IsotopeDatabase for the given tables, the tables are only read once
+
+    Args:
+        ame_file (str, optional): AME mass table (mass.mas20) location
+        isotopes_file (str, optional): isotopes.info file location
+        neutrons_file (str, optional): ENDF neutrons.list summary table location
+        cache_file (str, optional): binary cache of the parsed tables, None disables the on-disk cache
+
+    Returns:
+        IsotopeDatabase: shared database instance
+    """
+    cache_file = str(cache_file) if cache_file else None
+    return _cached_database(str(ame_file), str(isotopes_file), str(neutrons_file), cache_file)
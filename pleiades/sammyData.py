@@ -0,0 +1,129 @@
+# Utilities to write SAMMY data files
+
+import datetime
+import json
+import pathlib
+import numpy as np
+
+# record layout of the binary spectrum container
+SPECTRUM_DTYPE = np.dtype([("energy", "f8"), ("tof", "f8"), ("transmission", "f8"), ("uncertainty", "f8")])
+
+
+def write_twenty(filename: str, energy: np.ndarray, data: np.ndarray,
+                 error: np.ndarray = None, archivename: str = None) -> pathlib.Path:
+    """Write energy, data and (optionally) error columns in SAMMY's twenty-character format.
+
+    All rows are formatted with a single vectorized operation and written in one buffered call.
+
+    Args:
+        filename (str): output file name
+        energy (np.ndarray): energies in eV
+        data (np.ndarray): data values (e.g. transmission)
+        error (np.ndarray, optional): data uncertainties. Defaults to None (two-column file).
+        archivename (str, optional): if given, the file is written straight into the run directory
+                                     'archive/{archivename}' under its file name
+
+    Returns:
+        pathlib.Path: the path of the written file
+    """
+    filename = pathlib.Path(filename)
+    if archivename:
+        filename = pathlib.Path("archive") / archivename / filename.name
+    filename.parent.mkdir(parents=True, exist_ok=True)
+
+    columns = [energy, data] if error is None else [energy, data, error]
+    table = np.column_stack(np.broadcast_arrays(*[np.asarray(column, dtype=float) for column in columns]))
+
+    # each value takes twenty characters: a space and a 19 character wide number. Columns with values
+    # that do not fit the fixed-point format, e.g. energies of MeV, are written in exponent format
+    row_format = "".join(" %19.12f" if not np.any((column >= 1e6) | (column <= -1e5)) else " %19.12e"
+                         for column in table.T) + "\n"
+    with open(filename, "w") as fid:
+        fid.write((row_format * table.shape[0]) % tuple(table.ravel()))
+
+    return filename
+
+
+def save_spectrum(filename: str, energy: np.ndarray, transmission: np.ndarray,
+                  uncertainty: np.ndarray = None, tof: np.ndarray = None,
+                  metadata: dict = None, archivename: str = None) -> pathlib.Path:
+    """Save a spectrum in the binary container format.
+
+    The spectrum is stored as a structured .npy file with the fields of SPECTRUM_DTYPE, which can be
+    memory-mapped on reading, and its provenance metadata in a .json file next to it. Missing uncertainty
+    and tof columns are stored as NaN.
+
+    Args:
+        filename (str): output file name, the suffix is replaced by .npy
+        energy (np.ndarray): energies in eV
+        transmission (np.ndarray): transmission values
+        uncertainty (np.ndarray, optional): transmission uncertainties. Defaults to None.
+        tof (np.ndarray, optional): time-of-flight in us. Defaults to None.
+        metadata (dict, optional): JSON serializable provenance metadata. Defaults to None.
+        archivename (str, optional): if given, the file is written into the run directory 'archive/{archivename}'
+
+    Returns:
+        pathlib.Path: the path of the written .npy file
+    """
+    filename = pathlib.Path(filename).with_suffix(".npy")
+    if archivename:
+        filename = pathlib.Path("archive") / archivename / filename.name
+    filename.parent.mkdir(parents=True, exist_ok=True)
+
+    energy = np.asarray(energy, dtype=float)
+    spectrum = np.empty(energy.shape, dtype=SPECTRUM_DTYPE)
+    spectrum["energy"] = energy
+    spectrum["transmission"] = transmission
+    spectrum["uncertainty"] = np.nan if uncertainty is None else uncertainty
+    spectrum["tof"] = np.nan if tof is None else tof
+    np.save(filename, spectrum)
+
+    metadata = {"created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "columns": list(SPECTRUM_DTYPE.names),
+                "points": len(spectrum),
+                **(metadata or {})}
+    with open(filename.with_suffix(".json"), "w") as fid:
+        json.dump(metadata, fid, indent=2, default=str)
+
+    return filename
+
+
+def load_spectrum(filename: str, mmap_mode: str = "r") -> tuple:
+    """Load a spectrum saved with save_spectrum.
+
+    Args:
+        filename (str): the .npy file of the spectrum
+        mmap_mode (str, optional): memory-map mode passed to np.load, None reads the file into memory. Defaults to "r".
+
+    Returns:
+        tuple: structured array with the fields of SPECTRUM_DTYPE and the metadata dictionary
+    """
+    filename = pathlib.Path(filename).with_suffix(".npy")
+    spectrum = np.load(filename, mmap_mode=mmap_mode)
+
+    metadata_file = filename.with_suffix(".json")
+    metadata = {}
+    if metadata_file.exists():
+        with open(metadata_file) as fid:
+            metadata = json.load(fid)
+
+    return spectrum, metadata
+
+
+def spectrum_to_twenty(filename: str, output_file: str) -> pathlib.Path:
+    """Convert a binary spectrum to a SAMMY twenty-format data file.
+
+    The uncertainty column is written only if the spectrum holds uncertainties.
+
+    Args:
+        filename (str): the .npy file of the spectrum
+        output_file (str): the twenty-format data file to write
+
+    Returns:
+        pathlib.Path: the path of the written data file
+    """
+    spectrum, _ = load_spectrum(filename)
+    uncertainty = spectrum["uncertainty"]
+    if np.isnan(uncertainty).all():
+        uncertainty = None
+    return write_twenty(output_file, spectrum["energy"], spectrum["transmission"], uncertainty)
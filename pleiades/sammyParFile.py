@@ -4,6 +4,8 @@ import shelve
 import configparser
 from typing import Tuple, List, Dict, Any
 
+from pleiades.nucData import NEUTRON_MASS
+
 class ParFile:
     """ parFile class for the Sammy par file.
     """
@@ -295,6 +297,44 @@ class ParFile:
         self._parse_resonance_params_cards()
         self._parse_isotopic_masses_cards()
 
+        self._post_process()
+
+        return self
+
+
+    def read_endf(self, isotope: str = None, endf_file: str = None) -> 'ParFile':
+        """Reads the resolved resonance parameters of an isotope straight from the ENDF library
+        into the same data-structure as read(), without running SAMMY
+
+        Particle pairs, spin groups, channel radii and resonances are laid out as SAMMY does when it
+        converts ENDF files: one spin group for each (L, channel spin, J) that has resonances, and
+        widths in meV. Breit-Wigner ranges are read into the same tables, their total widths are dropped.
+
+        Args:
+            isotope (str, optional): isotope name, e.g. "Eu-151". Defaults to the file name, e.g. 'Eu_151.par'
+            endf_file (str, optional): ENDF file. Defaults to endfData.ENDF_FILE
+
+        Returns:
+            ParFile: the ParFile instance
+        """
+        from pleiades import endfData, nucData
+
+        self._filepath = pathlib.Path(self.filename)
+        if isotope is None:
+            isotope = self._filepath.stem.replace("_","-")
+
+        endf = endfData.read_resonances(nucData.get_mat_number(isotope), endf_file or endfData.ENDF_FILE)
+        self.data.update(self._endf_to_data(endf))
+        self.data["isotopic_masses"] = {}
+
+        self._post_process()
+
+        return self
+
+
+    def _post_process(self) -> None:
+        """rename the isotope and set default values after the cards are parsed
+        """
         # rename
         # the option name=="none" is saved for the purpose of tests
         if self.name!="none":
@@ -307,10 +347,132 @@ class ParFile:
             self.update.broadening()
             self.update.resolution()
             self.update.misc()
-            
 
-        return self
-    
+
+    def _endf_to_data(self, endf: dict) -> dict:
+        """ convert the resonance parameters read by endfData.read_resonances to particle_pairs,
+            spin_group, channel_radii and resonance_params data
+
+            Args:
+                - endf (dict): resonance parameters of a single isotope material
+
+            Returns: (dict): the data entries
+        """
+        if len(endf["isotopes"]) != 1:
+            raise ValueError("only single isotope ENDF materials can be converted")
+        ranges = endf["isotopes"][0]["ranges"]
+        if not ranges:
+            raise ValueError("the ENDF material has no resolved resonances")
+
+        target_spin = ranges[0]["SPI"]
+        mass = endf["AWR"]*NEUTRON_MASS
+
+        # resonances keyed by their spin group (L, channel spin, |J|), with widths in meV
+        resonances = []
+        radii = {}
+        for resolved_range in ranges:
+            for l_value in resolved_range["l_values"]:
+                L = l_value["L"]
+                effective_radius = l_value["APL"] or resolved_range["AP"]
+                true_radius = effective_radius if resolved_range["NAPS"]==1 else 1.23*mass**(1/3) + 0.8
+                for row in l_value["resonances"]:
+                    if resolved_range["LRF"]==3:
+                        energy, AJ, neutron_width, capture_width, fission1_width, fission2_width = row
+                    else:
+                        energy, AJ, _, neutron_width, capture_width, fission1_width = row
+                        fission2_width = 0.
+                    key = (L, self._channel_spin(target_spin, L, AJ), abs(AJ))
+                    radii[key] = (effective_radius, true_radius)
+                    resonances.append((key, energy, 1e3*capture_width, 1e3*neutron_width, 1e3*fission1_width, 1e3*fission2_width))
+
+        keys = sorted(radii)
+        group_numbers = {key: number for number, key in enumerate(keys, start=1)}
+        n_fission = 2 if any(res[5] for res in resonances) else 1 if any(res[4] for res in resonances) else 0
+        fission_groups = {res[0] for res in resonances if res[4] or res[5]}
+
+        particle_pairs = [{"name": f"{'PPair1':<9}", "particle_a": f"{'neutron':<9}", "particle_b": f"{'Other':<8}",
+                           "charge_a": f"{0:>2}", "charge_b": f"{endf['ZA']//1000:>2}",
+                           "vary_penetrability": "1", "vary_shift": "0",
+                           "spin_a": f"{0.5:>5.1f}", "spin_b": f"{target_spin:>6.1f}",
+                           "mass_a": f"{NEUTRON_MASS:>20.15f}", "mass_b": f"{mass:>20.15f}"}]
+        if n_fission:
+            particle_pairs.append({"name": f"{'PPair2':<9}", "particle_a": f"{'fission':<9}", "particle_b": f"{'fission':<8}",
+                                   "charge_a": f"{0:>2}", "charge_b": f"{0:>2}",
+                                   "vary_penetrability": "0", "vary_shift": "0",
+                                   "spin_a": f"{0:>5.1f}", "spin_b": f"{0:>6.1f}",
+                                   "mass_a": f"{0:>20.15f}", "mass_b": f"{0:>20.15f}"})
+
+        spin_groups = []
+        channel_radii = {}
+        for key in keys:
+            L, channel_spin, J = key
+            effective_radius, true_radius = radii[key]
+            n_exit = n_fission if key in fission_groups else 0
+            # the sign of the spin is the parity of the group
+            group = [{"group_number": f"{group_numbers[key]:>3}", "exclude": " ",
+                      "n_entrance_channel": f"{1:>3}", "n_exit_channel": f"{n_exit:>3}",
+                      "spin": f"{J if L%2==0 else -J:>5.1f}", "isotopic_abundance": f"{1:>10.7f}"}]
+            for channel in range(1, n_exit+2):
+                group.append({"channel_number": f"{channel:>3}",
+                              "channel_name": f"{'PPair1' if channel==1 else 'PPair2':>8}",
+                              "exclude": " ",
+                              "L_spin": f"{L if channel==1 else 0:>2}",
+                              "channel_spin": f"{channel_spin if channel==1 else 0:>10g}",
+                              "boundary_condition": " "*10,
+                              "effective_radius": f"{effective_radius:>11.8f}",
+                              "true_radius": f"{true_radius:>11.8f}"})
+            spin_groups.append(group)
+            channel_radii.setdefault(radii[key], []).append([group_numbers[key], *range(1, n_exit+2)])
+
+        channel_radii = [{"radii": [f"{radius:.5f}".rstrip("0").rstrip(".") for radius in radius_pair],
+                          "flags": ["0", "0"],
+                          "groups": groups} for radius_pair, groups in channel_radii.items()]
+
+        resonance_params = []
+        for key, energy, capture_width, neutron_width, fission1_width, fission2_width in sorted(resonances, key=lambda res: (group_numbers[res[0]], res[1])):
+            has_fission = key in fission_groups
+            resonance_params.append({"reosnance_energy": self._format_float(energy),
+                                     "capture_width": self._format_float(capture_width),
+                                     "neutron_width": self._format_float(neutron_width),
+                                     "fission1_width": self._format_float(fission1_width) if has_fission else " "*11,
+                                     "fission2_width": self._format_float(fission2_width) if has_fission and n_fission==2 else " "*11,
+                                     "vary_energy": "  ",
+                                     "vary_capture_width": "  ",
+                                     "vary_neutron_width": "  ",
+                                     "vary_fission1_width": "  ",
+                                     "vary_fission2_width": "  ",
+                                     "igroup": f"{group_numbers[key]:>2}"})
+
+        return {"particle_pairs": particle_pairs,
+                "spin_group": spin_groups,
+                "channel_radii": channel_radii,
+                "resonance_params": resonance_params}
+
+
+    @staticmethod
+    def _channel_spin(target_spin: float, L: int, AJ: float) -> float:
+        """ channel spin s of a resonance with orbital momentum L and spin |AJ|
+
+            s = I -/+ 1/2 couples with L to J. When both are allowed, a negative AJ selects the lower
+            channel spin, as in ENDF Reich-Moore evaluations.
+        """
+        J = abs(AJ)
+        spins = sorted({abs(target_spin - 0.5), target_spin + 0.5})
+        allowed = [spin for spin in spins if abs(J - spin) <= L <= J + spin]
+        if len(allowed) == 2:
+            return allowed[0] if AJ < 0 else allowed[1]
+        return allowed[0] if allowed else spins[-1]
+
+
+    @staticmethod
+    def _format_float(value: float, width: int = 11) -> str:
+        """ format a number into a fixed width field with as many digits as fit
+        """
+        if value and not 1e-3 <= abs(value) < 10**(width - 3):
+            return f"{value:>{width}.{width - 7}e}"
+        digits = width - 2 - len(str(int(abs(value)))) - (value < 0)
+        return f"{value:>{width}.{digits}f}"
+
 
     def write(self,filename: str="compound.par") -> None:
         """ writes the data stored in self.data dictionary into a SAMMY .par file
@@ -876,7 +1038,7 @@ class Update():
         igroups = set()
         for num, res in enumerate(self.parent.data["resonance_params"]):
             # cast all numbers such as "3.6700-5" to floats
-            energy = "e-".join(res['reosnance_energy'].split("-")).lstrip("e").replace("+","e+") if not "e" in res['reosnance_energy'] else res['reosnance_energy']
+            energy = "e-".join(res['reosnance_energy'].strip().split("-")).lstrip("e").replace("+","e+") if not "e" in res['reosnance_energy'] else res['reosnance_energy']
 
             emin = float(self.parent.data["info"]["emin"])
             emax = float(self.parent.data["info"]["emax"])
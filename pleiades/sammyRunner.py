@@ -1,25 +1,251 @@
 import pathlib
-import inspect
 import glob
 import time
 import os
 import shutil
+import signal
+import subprocess
+import sys
+import asyncio
+import weakref
+import functools
+import hashlib
+import tempfile
+import threading
 
-def run(archivename: str="example",
-            inpfile: str = "",
-            parfile: str = "",
-            datafile: str = "") -> None:
-    """run the sammy program inside an archive directory
+from pleiades import sammyData, endfData
+
+# name or path of the sammy executable
+SAMMY_EXECUTABLE = "sammy"
+
+# default number of concurrent sammy runs of run_async
+MAX_CONCURRENT_RUNS = os.cpu_count()
+
+# default semaphore of run_async for each event loop
+_SEMAPHORES = weakref.WeakKeyDictionary()
+
+# default location of the sammy result cache
+RESULT_CACHE_DIR = pathlib.Path.home() / ".cache" / "pleiades" / "sammy"
+
+# result cache used by run and run_async, disabled unless enable_result_cache is called
+RESULT_CACHE = None
+
+# how input files are staged into the archive directories, see stage_file
+STAGING_MODE = "reflink"
+
+# the methods each staging mode tries, in order
+STAGING_MODES = {"copy": ("copy",),
+                 "reflink": ("reflink", "copy"),
+                 "hardlink": ("hardlink", "reflink", "copy")}
+
+# directory in which sammy runs execute instead of the archive, None runs inside the archive directory and
+# True uses default_scratch_dir(). Only the results/ files and the sammy output are copied back to the archive.
+SCRATCH_DIR = None
+
+# ioctl request cloning a file on copy-on-write filesystems (btrfs, xfs, ...), linux/fs.h
+_FICLONE = 0x40049409
+
+
+def _run_sammy(archive_path: pathlib.Path, outputfile: str, input_files: list,
+               timeout: float = None) -> subprocess.CompletedProcess:
+    """run sammy inside the archive directory, answering its prompts with the input file names
+
+    The working directory is set for the sammy process only, so several runs can be driven
+    concurrently from one python process. The child is reaped with os.wait4 to record its resource usage.
 
     Args:
-        archivename (str): archive directory name. If only archivename is provided
-                           the other file names will be assumed to have the same name 
-                           at the archive has with the associate extension, e.g. {archivename}.inp
-        inpfile (str, optional): input file name
-        parfile (str, optional): parameter file name
-        datafile (str, optional): data file name
+        archive_path (pathlib.Path): the directory to run sammy in
+        outputfile (str): file name inside archive_path to write the sammy stdout to
+        input_files (list): file names given to sammy on stdin
+        timeout (float, optional): time limit in seconds, sammy is killed and subprocess.TimeoutExpired
+                                   is raised when it is exceeded. Defaults to None.
+
+    Returns:
+        subprocess.CompletedProcess: the finished process with its return code and captured stdout/stderr,
+                                     its resource usage is in the `usage` attribute
     """
+    stdin = "".join(f"{filename}\n" for filename in input_files) + "\n"
+    start = time.perf_counter()
+    process = subprocess.Popen([SAMMY_EXECUTABLE], cwd=archive_path, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+    # drain the output pipes in the background, so that sammy never blocks on a full pipe
+    output = {}
+    readers = [threading.Thread(target=lambda name, pipe: output.update({name: pipe.read()}), args=(name, pipe))
+               for name, pipe in [("stdout", process.stdout), ("stderr", process.stderr)]]
+    for reader in readers:
+        reader.start()
+    try:
+        process.stdin.write(stdin)
+        process.stdin.close()
+    except BrokenPipeError:
+        # sammy exited without reading its input
+        pass
+
+    # the timer signals the pid only while it is not reaped, Popen.kill would poll and could reap it itself.
+    # The exit is awaited without reaping, so the pid cannot be reused before the timer is disabled.
+    lock = threading.Lock()
+    state = {"reaped": False, "killed": False}
+    def expire():
+        with lock:
+            if not state["reaped"]:
+                os.kill(process.pid, signal.SIGKILL)
+                state["killed"] = True
+    timer = threading.Timer(timeout, expire) if timeout is not None else None
+    if timer:
+        timer.start()
+    os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+    with lock:
+        state["reaped"] = True
+    if timer:
+        timer.cancel()
+    _, status, rusage = os.wait4(process.pid, 0)
+    process.returncode = _exit_code(status)
+    wall_time = time.perf_counter() - start
+
+    for reader in readers:
+        reader.join()
+    process.stdout.close()
+    process.stderr.close()
+    if state["killed"]:
+        raise subprocess.TimeoutExpired(SAMMY_EXECUTABLE, timeout, output.get("stdout"), output.get("stderr"))
+
+    completed = subprocess.CompletedProcess([SAMMY_EXECUTABLE], process.returncode, output["stdout"], output["stderr"])
+    completed.usage = {"wall_time": wall_time,
+                       "user_time": rusage.ru_utime,
+                       "system_time": rusage.ru_stime,
+                       "cpu_time": rusage.ru_utime + rusage.ru_stime,
+                       # ru_maxrss is in kilobytes on linux and in bytes on macOS
+                       "max_rss_bytes": rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)}
+    with open(archive_path / outputfile, "w") as fid:
+        fid.write(completed.stdout)
+    return completed
+
+
+def _exit_code(status: int) -> int:
+    """return code of a wait status, negative signal number if the process was killed by a signal like Popen"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _file_sizes(paths) -> int:
+    """total size in bytes of the existing files among paths"""
+    return sum(path.stat().st_size for path in map(pathlib.Path, paths) if path.is_file())
+
+
+def _write_run_stats(archive_path: pathlib.Path, archivename: str, input_files: list,
+                     completed: subprocess.CompletedProcess, timings: dict, cached: bool = False) -> pathlib.Path:
+    """write the resource usage of a run to results/{archivename}.run.json
+
+    Args:
+        archive_path (pathlib.Path): the archive directory of the run
+        archivename (str): the archive name
+        input_files (list): the input file names inside archive_path
+        completed (subprocess.CompletedProcess): the finished sammy process
+        timings (dict): durations in seconds of the run stages
+        cached (bool, optional): True if the results were restored from the result cache. Defaults to False.
+
+    Returns:
+        pathlib.Path: the path of the json file
+    """
+    import json
+
+    results_path = archive_path / "results"
+    stats = {"archivename": str(archivename),
+             "returncode": completed.returncode,
+             "cached": cached,
+             "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+             "timings": timings,
+             "sammy": getattr(completed, "usage", None),
+             "bytes_staged": _file_sizes(archive_path / str(filename) for filename in input_files),
+             "bytes_produced": _file_sizes([archive_path / f"{archivename}.out",
+                                            *(path for path in results_path.glob(f"{archivename}.*") if path.suffix != ".json")])}
+
+    stats_file = results_path / f"{archivename}.run.json"
+    with open(stats_file, "w") as fid:
+        json.dump(stats, fid, indent=2)
+    return stats_file
+
+
+def _reflink(source: pathlib.Path, destination: pathlib.Path) -> None:
+    """clone source into a new destination file that shares its data blocks
+
+    Raises:
+        OSError: if the platform or the filesystem does not support cloning
+    """
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError("reflinks are not supported on this platform")
+
+    with open(source, "rb") as src, open(destination, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            dst.close()
+            os.remove(destination)
+            raise
+    shutil.copymode(source, destination)
+
+
+def stage_file(source: str, destination: str, mode: str = None) -> str:
+    """place a file into a run directory, avoiding a copy of its data where possible
+
+    The modes are:
+        - "copy": always copy the file
+        - "reflink": clone the file on copy-on-write filesystems, otherwise copy it
+        - "hardlink": hardlink the file, otherwise like "reflink". The staged file is the source file itself,
+                      so a source that is later rewritten in place changes the archived input too.
+
+    An existing destination is replaced, never written through. A destination that is the source itself,
+    e.g. a file generated inside the run directory, is left as is.
 
+    Args:
+        source (str): file to stage
+        destination (str): location of the file inside the run directory
+        mode (str, optional): "copy", "reflink" or "hardlink". Defaults to STAGING_MODE.
+
+    Raises:
+        FileNotFoundError: if the source does not exist
+
+    Returns:
+        str: how the file was staged: "hardlink", "reflink", "copy" or "none"
+    """
+    mode = mode or STAGING_MODE
+    if mode not in STAGING_MODES:
+        raise ValueError(f"unknown staging mode {mode}, use one of {list(STAGING_MODES)}")
+    source, destination = pathlib.Path(source), pathlib.Path(destination)
+
+    # a missing source raises before the destination is touched
+    source.stat()
+    if os.path.lexists(destination):
+        if not destination.is_symlink() and source.resolve() == destination.resolve():
+            return "none"
+        destination.unlink()
+
+    for method in STAGING_MODES[mode]:
+        try:
+            if method == "hardlink":
+                os.link(source, destination)
+            elif method == "reflink":
+                _reflink(source, destination)
+            else:
+                shutil.copy(source, destination)
+            return method
+        except OSError:
+            # e.g. another filesystem or no copy-on-write support, try the next method
+            if method == "copy":
+                raise
+
+
+def _stage_run(archivename: str, inpfile: str = "", parfile: str = "", datafile: str = "",
+               staging: str = None) -> tuple:
+    """create the archive directory of a run and stage the input files into it, see run
+
+    Returns:
+        tuple: the archive path and the input file names to give to sammy
+    """
     # if no file names are provided, assume they are the same as the archive name
     if not inpfile:
         inpfile = f"{archivename}.inp"
@@ -36,41 +262,32 @@ def run(archivename: str="example",
     os.makedirs(archive_path / "results",exist_ok=True)
 
 
-    # copy files into archive
-    try:
-        shutil.copy(inpfile, archive_path / f'{archivename}.inp')
-        inpfile = f'{archivename}.inp'
-        shutil.copy(parfile, archive_path / f'{archivename}.par')
-        parfile = f'{archivename}.par'
-        shutil.copy(datafile, archive_path / f'{archivename}.dat')
+    # stage files into archive, files that are not found are taken from within the archive directory
+    input_files = []
+    for filename, suffix in [(inpfile, ".inp"), (parfile, ".par"), (datafile, ".dat")]:
+        if pathlib.Path(filename).suffix != ".npy":
+            try:
+                stage_file(filename, archive_path / f'{archivename}{suffix}', staging)
+                filename = f'{archivename}{suffix}'
+            except FileNotFoundError:
+                pass
+        input_files.append(filename)
+    inpfile, parfile, datafile = input_files
+
+    # binary spectra are converted to twenty format only at the moment the run is staged
+    if pathlib.Path(datafile).suffix == ".npy":
+        source = pathlib.Path(datafile) if pathlib.Path(datafile).exists() else archive_path / datafile
+        # never write through a link staged by an earlier run
+        (archive_path / f'{archivename}.dat').unlink(missing_ok=True)
+        sammyData.spectrum_to_twenty(source, archive_path / f'{archivename}.dat')
         datafile = f'{archivename}.dat'
-    except FileNotFoundError:
-        # print(f"grab files from within the {archive_path} directory")
-        pass
 
-    outputfile = f'{archivename}.out'
+    return archive_path, [inpfile, parfile, datafile]
 
-    # generate the run command
-    run_command = f"""sammy > {outputfile} 2>/dev/null << EOF
-                      {inpfile}
-                      {parfile}
-                      {datafile}
-
-                      EOF 
-                      """
-    # remove indentation
-    run_command = inspect.cleandoc(run_command) # remove indentation
-    
-    # 
-    pwd = pathlib.Path.cwd()
-
-    # change directory to the archive, run sammy, and return to the original directory
-    os.chdir(archive_path)
-    os.system(run_command) 
-    os.chdir(pwd)
 
+def _collect_results(archive_path: pathlib.Path, archivename: str) -> None:
+    """move the sammy output files of a finished run into the results directory of the archive"""
     # move files
-
     try:
         shutil.move(archive_path /'SAMMY.LST', archive_path / f'results/{archivename}.lst')
     except FileNotFoundError:
@@ -91,10 +308,354 @@ def run(archivename: str="example",
             os.remove(f)
     except FileNotFoundError:
         print("par file is not found")
-    return
 
 
-def run_endf(inpfile: str = "") -> None:
+def default_scratch_dir() -> pathlib.Path:
+    """the default scratch directory of sammy runs: the /dev/shm tmpfs when it is available,
+    otherwise the temporary directory of the system ($TMPDIR)
+
+    Returns:
+        pathlib.Path: the scratch directory
+    """
+    shm = pathlib.Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return pathlib.Path(tempfile.gettempdir())
+
+
+def _scratch_root(scratch) -> pathlib.Path:
+    """resolve the scratch argument of run, None if the run executes inside the archive"""
+    scratch = SCRATCH_DIR if scratch is None else scratch
+    if not scratch:
+        return None
+    return default_scratch_dir() if scratch is True else pathlib.Path(scratch)
+
+
+def _stage_scratch(archive_path: pathlib.Path, archivename: str, input_files: list,
+                   scratch_root: pathlib.Path) -> pathlib.Path:
+    """create a private run directory in scratch_root holding the staged inputs of a run
+
+    Returns:
+        pathlib.Path: the run directory
+    """
+    scratch_root.mkdir(parents=True, exist_ok=True)
+    run_path = pathlib.Path(tempfile.mkdtemp(dir=scratch_root, prefix=f"pleiades-{archivename}-"))
+    (run_path / "results").mkdir()
+
+    resolution_files = [path.name for path in archive_path.glob("*.udp")]
+    for filename in [*map(str, input_files), *resolution_files]:
+        source = archive_path / filename
+        if source.is_symlink():
+            # e.g. the whole ENDF library, which is not worth copying into memory
+            os.symlink(source.resolve(), run_path / filename)
+        elif source.exists():
+            stage_file(source, run_path / filename, "reflink")
+    return run_path
+
+
+def _collect_scratch(run_path: pathlib.Path, archive_path: pathlib.Path, archivename: str) -> None:
+    """copy the results/ files and the sammy output of a run executed in scratch back into the archive"""
+    for path in (run_path / "results").iterdir():
+        stage_file(path, archive_path / "results" / path.name, "copy")
+    if (run_path / f"{archivename}.out").exists():
+        stage_file(run_path / f"{archivename}.out", archive_path / f"{archivename}.out", "copy")
+
+
+# result files kept by the cache, {archivename}.out is kept as "out"
+RESULT_SUFFIXES = ["lst", "lpt", "io", "par"]
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(filename: str, size: int, mtime_ns: int) -> str:
+    """sha256 of a file, memoized on its path, size and modification time"""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fid:
+        for block in iter(lambda: fid.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_digest(filename: str) -> str:
+    """sha256 of a file, computed once per version of the file
+
+    Args:
+        filename (str): the file to hash, symbolic links are followed
+
+    Returns:
+        str: hex digest of the file content
+    """
+    stat = os.stat(filename)
+    return _file_digest(os.path.realpath(filename), stat.st_size, stat.st_mtime_ns)
+
+
+def _sammy_version() -> str:
+    """identify the sammy executable by the hash of its binary"""
+    executable = shutil.which(SAMMY_EXECUTABLE)
+    return file_digest(executable) if executable else ""
+
+
+class ResultCache:
+    """content-addressed store of sammy results
+
+    A run is identified by the hash of its staged inp, par and dat files, the resolution (.udp) files
+    in the archive directory and the sammy binary. Each entry holds the results/ files and the sammy stdout
+    of one run. Entries are evicted least recently used first once the store exceeds max_bytes.
+    """
+    def __init__(self, directory: str = RESULT_CACHE_DIR, max_bytes: int = 1024**3):
+        """
+        Args:
+            directory (str, optional): cache directory. Defaults to RESULT_CACHE_DIR.
+            max_bytes (int, optional): size limit of the cache. Defaults to 1 GB.
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, archive_path: pathlib.Path, input_files: list) -> str:
+        """hash the inputs of a staged run
+
+        Args:
+            archive_path (pathlib.Path): the archive directory of the run
+            input_files (list): the inp, par and dat file names inside archive_path
+
+        Returns:
+            str: the cache key
+        """
+        digest = hashlib.sha256(_sammy_version().encode())
+        # only the contents count, so identical inputs staged under another archive name share the entry
+        for role, filename in zip(["inp", "par", "data"], input_files):
+            digest.update(f"{role}:{file_digest(archive_path / str(filename))}".encode())
+        for resolution_digest in sorted(file_digest(path) for path in archive_path.glob("*.udp") if path.exists()):
+            digest.update(f"resolution:{resolution_digest}".encode())
+        return digest.hexdigest()
+
+    def restore(self, key: str, archive_path: pathlib.Path, archivename: str) -> subprocess.CompletedProcess:
+        """copy the results of a cached run into the archive
+
+        Args:
+            key (str): the cache key
+            archive_path (pathlib.Path): the archive directory of the run
+            archivename (str): the archive name, used to name the result files
+
+        Returns:
+            subprocess.CompletedProcess: the cached sammy process, None if the run is not cached
+        """
+        files = {suffix: archive_path / f"results/{archivename}.{suffix}" for suffix in RESULT_SUFFIXES}
+        files["out"] = archive_path / f"{archivename}.out"
+        if not self.restore_files(key, files) or not (self.directory / key / "out").exists():
+            return None
+        with open(archive_path / f"{archivename}.out") as fid:
+            return subprocess.CompletedProcess([SAMMY_EXECUTABLE], 0, fid.read(), "")
+
+    def store(self, key: str, archive_path: pathlib.Path, archivename: str) -> None:
+        """add the results of a finished run to the cache and evict old entries
+
+        Args:
+            key (str): the cache key
+            archive_path (pathlib.Path): the archive directory of the run
+            archivename (str): the archive name of the result files
+        """
+        files = {suffix: archive_path / f"results/{archivename}.{suffix}" for suffix in RESULT_SUFFIXES}
+        files["out"] = archive_path / f"{archivename}.out"
+        self.store_files(key, files)
+
+    def restore_files(self, key: str, files: dict) -> bool:
+        """copy the files of an entry to their destinations
+
+        Args:
+            key (str): the cache key
+            files (dict): destination paths keyed by the file names inside the entry,
+                          names the entry does not hold are skipped
+
+        Returns:
+            bool: False if the key is not cached
+        """
+        entry = self.directory / key
+        try:
+            for name, destination in files.items():
+                if (entry / name).exists():
+                    stage_file(entry / name, destination, "reflink")
+            os.utime(entry)
+        except FileNotFoundError:
+            # not cached, or evicted meanwhile
+            return False
+        return True
+
+    def store_files(self, key: str, files: dict) -> None:
+        """add an entry holding the existing files, then evict old entries
+
+        The entry is assembled in a temporary directory and renamed into place, so it is never seen incomplete.
+
+        Args:
+            key (str): the cache key
+            files (dict): source paths keyed by the file names inside the entry, missing sources are skipped
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        staging = pathlib.Path(tempfile.mkdtemp(dir=self.directory, prefix=".tmp-"))
+        for name, source in files.items():
+            if pathlib.Path(source).exists():
+                stage_file(source, staging / name, "reflink")
+
+        try:
+            os.rename(staging, self.directory / key)
+        except OSError:
+            # stored by a concurrent run
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> list:
+        """list the cache entries, least recently used first
+
+        Returns:
+            list: (last use time, size in bytes, path) of each entry
+        """
+        entries = []
+        for entry in self.directory.glob("[0-9a-f]*"):
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((entry.stat().st_mtime, size, entry))
+            except FileNotFoundError:
+                pass
+        return sorted(entries)
+
+    @property
+    def nbytes(self) -> int:
+        """int: size of the cache in bytes"""
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> None:
+        """remove the least recently used entries until the cache fits into max_bytes"""
+        with self._lock:
+            entries = self.entries()
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def clear(self) -> None:
+        """remove all entries"""
+        for _, _, entry in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+def enable_result_cache(directory: str = RESULT_CACHE_DIR, max_bytes: int = 1024**3) -> ResultCache:
+    """use a result cache for all following sammy runs
+
+    Args:
+        directory (str, optional): cache directory. Defaults to RESULT_CACHE_DIR.
+        max_bytes (int, optional): size limit of the cache. Defaults to 1 GB.
+
+    Returns:
+        ResultCache: the new default cache
+    """
+    global RESULT_CACHE
+    RESULT_CACHE = ResultCache(directory, max_bytes)
+    return RESULT_CACHE
+
+
+def disable_result_cache() -> None:
+    """stop using the result cache for sammy runs"""
+    global RESULT_CACHE
+    RESULT_CACHE = None
+
+
+def _cache_lookup(cache, archive_path: pathlib.Path, archivename: str, input_files: list) -> tuple:
+    """return the cache key of a staged run and its cached process, if any"""
+    if not cache:
+        return None, None
+    try:
+        key = cache.key(archive_path, input_files)
+    except FileNotFoundError:
+        # incomplete inputs, let sammy report the error
+        return None, None
+    return key, cache.restore(key, archive_path, archivename)
+
+
+def _cache_store(cache, key: str, completed: subprocess.CompletedProcess,
+                 archive_path: pathlib.Path, archivename: str) -> None:
+    """store the results of a successful run"""
+    if key and completed.returncode == 0 and (archive_path / f"results/{archivename}.lpt").exists():
+        cache.store(key, archive_path, archivename)
+
+
+def run(archivename: str="example",
+            inpfile: str = "",
+            parfile: str = "",
+            datafile: str = "",
+            timeout: float = None,
+            cache: ResultCache = None,
+            staging: str = None,
+            scratch=None) -> subprocess.CompletedProcess:
+    """run the sammy program inside an archive directory
+
+    Args:
+        archivename (str): archive directory name. If only archivename is provided
+                           the other file names will be assumed to have the same name 
+                           at the archive has with the associate extension, e.g. {archivename}.inp
+        inpfile (str, optional): input file name
+        parfile (str, optional): parameter file name
+        datafile (str, optional): data file name, a binary spectrum (.npy, see sammyData.save_spectrum)
+                                  is converted to twenty format inside the archive
+        timeout (float, optional): time limit of the sammy run in seconds. Defaults to None.
+        cache (ResultCache, optional): result cache, the results of a run with identical inputs are restored
+                                       instead of running sammy. Defaults to RESULT_CACHE, False disables caching.
+        staging (str, optional): how the input files are placed into the archive, "copy", "reflink" or
+                                 "hardlink", see stage_file. Defaults to STAGING_MODE.
+        scratch (str, optional): execute sammy in a private directory inside scratch, e.g. "/dev/shm", and copy
+                                 only the results/ files and the sammy output back into the archive, so the sammy
+                                 scratch files never reach the archive filesystem. True uses default_scratch_dir(),
+                                 False runs inside the archive. Defaults to SCRATCH_DIR.
+
+    Returns:
+        subprocess.CompletedProcess: the finished (or cached) sammy process
+    """
+    cache = RESULT_CACHE if cache is None else cache
+    timings = {}
+    start = time.perf_counter()
+
+    archive_path, input_files = _stage_run(archivename, inpfile, parfile, datafile, staging)
+    key, cached = _cache_lookup(cache, archive_path, archivename, input_files)
+    timings["stage"] = time.perf_counter() - start
+    if cached:
+        timings["total"] = timings["stage"]
+        _write_run_stats(archive_path, archivename, input_files, cached, timings, cached=True)
+        return cached
+
+    scratch_root = _scratch_root(scratch)
+    run_path = _stage_scratch(archive_path, archivename, input_files, scratch_root) if scratch_root else archive_path
+    timings["stage"] = time.perf_counter() - start
+
+    # run sammy inside the archive (or scratch) directory
+    try:
+        completed = _run_sammy(run_path, f'{archivename}.out', input_files, timeout=timeout)
+        timings["sammy"] = completed.usage["wall_time"]
+
+        collect_start = time.perf_counter()
+        _collect_results(run_path, archivename)
+        if scratch_root:
+            _collect_scratch(run_path, archive_path, archivename)
+    finally:
+        if scratch_root:
+            shutil.rmtree(run_path, ignore_errors=True)
+    _cache_store(cache, key, completed, archive_path, archivename)
+    timings["collect"] = time.perf_counter() - collect_start
+    timings["total"] = time.perf_counter() - start
+
+    _write_run_stats(archive_path, archivename, input_files, completed, timings)
+    return completed
+
+
+def _endf_mat_number(inpfile: pathlib.Path) -> int:
+    """read the MAT number from the 'INPUT IS ENDF/B FILE MAT=' command of a sammy input file"""
+    import re
+    with open(inpfile) as fid:
+        match = re.search(r"INPUT IS ENDF/B FILE\s+MAT\s*=\s*(\d+)", fid.read(), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def run_endf(inpfile: str = "", timeout: float = None, staging: str = None, scratch=None) -> subprocess.CompletedProcess:
     """
     run sammy input with endf isotopes tables file to create a par file
     - This can only be done for a single isotope at a time
@@ -102,8 +663,16 @@ def run_endf(inpfile: str = "") -> None:
     - archive path name will be deducd from input name
 
     Args:
-        inpfile (str): input file name
-    """    
+        inpfile (str): input file name, an input file written inside archive/{name}/ is used in place
+        timeout (float, optional): time limit of the sammy run in seconds. Defaults to None.
+        staging (str, optional): how the input file is placed into the archive, see stage_file.
+                                 Defaults to STAGING_MODE.
+        scratch (str, optional): scratch directory to execute sammy in, see run. Defaults to SCRATCH_DIR.
+
+    Returns:
+        subprocess.CompletedProcess: the finished sammy process
+    """
+    start = time.perf_counter()
 
     inpfile= pathlib.Path(inpfile)
     archivename = pathlib.Path(inpfile.stem)
@@ -120,11 +689,9 @@ def run_endf(inpfile: str = "") -> None:
     os.makedirs(archive_path / "results",exist_ok=True)
 
 
-    # copy files into archive
-    shutil.copy(inpfile, archive_path / archivename.with_suffix(".inp"))
+    # stage files into archive
+    stage_file(inpfile, archive_path / archivename.with_suffix(".inp"), staging)
     inpfile = archivename.with_suffix(".inp")
-    
-
 
 
     # write a fake datafile with two entries of Emin and Emax
@@ -134,40 +701,232 @@ def run_endf(inpfile: str = "") -> None:
     
     datafile = f'{archivename}.dat'
 
-    import nucDataLibs
-    endffile = pathlib.Path(nucDataLibs.__file__).parent / "resonanceTables/res_endf8.endf"
+    # write only the material of the isotope into the archive, link the whole library if it is not indexed
+    mat = _endf_mat_number(archive_path / inpfile)
     try:
-        os.symlink(endffile,archive_path / 'res_endf8.endf')
-    except FileExistsError:
-        pass
-    endffile = 'res_endf8.endf'
+        endfData.extract_mat(mat, archive_path / f'{archivename}.endf', endfData.ENDF_FILE)
+        endffile = f'{archivename}.endf'
+    except (OSError, KeyError):
+        try:
+            os.symlink(endfData.ENDF_FILE,archive_path / 'res_endf8.endf')
+        except FileExistsError:
+            pass
+        endffile = 'res_endf8.endf'
 
     outputfile = f'{archivename}.out'
+    input_files = [inpfile, endffile, datafile]
+    scratch_root = _scratch_root(scratch)
+    run_path = _stage_scratch(archive_path, archivename, input_files, scratch_root) if scratch_root else archive_path
+    timings = {"stage": time.perf_counter() - start}
 
-    run_command = f"""sammy > {outputfile} 2>/dev/null << EOF
-                      {inpfile}
-                      {endffile}
-                      {datafile}
+    # run sammy inside the archive (or scratch) directory
+    try:
+        completed = _run_sammy(run_path, outputfile, input_files, timeout=timeout)
+        timings["sammy"] = completed.usage["wall_time"]
+        collect_start = time.perf_counter()
 
-                      EOF 
-                      """
-    run_command = inspect.cleandoc(run_command) # remove indentation
-    
-    pwd = pathlib.Path.cwd()
+        # move files
+        shutil.move(run_path /'SAMNDF.PAR', run_path / f'results/{archivename}.par')
+        shutil.move(run_path /'SAMNDF.INP', run_path / f'results/{archivename}.inp')
+        shutil.move(run_path /'SAMMY.LPT', run_path / f'results/{archivename}.lpt')
 
-    os.chdir(archive_path)
-    os.system(run_command) # run sammy
-    os.chdir(pwd)
 
-    # move files
-    shutil.move(archive_path /'SAMNDF.PAR', archive_path / f'results/{archivename}.par')
-    shutil.move(archive_path /'SAMNDF.INP', archive_path / f'results/{archivename}.inp')
-    shutil.move(archive_path /'SAMMY.LPT', archive_path / f'results/{archivename}.lpt')
+        # remove SAM*.*
+        filelist = glob.glob(f"{run_path}/SAM*")
+        for f in filelist:
+            os.remove(f)
+
+        if scratch_root:
+            _collect_scratch(run_path, archive_path, archivename)
+    finally:
+        if scratch_root:
+            shutil.rmtree(run_path, ignore_errors=True)
+
+    timings["collect"] = time.perf_counter() - collect_start
+    timings["total"] = time.perf_counter() - start
+    _write_run_stats(archive_path, archivename, input_files, completed, timings)
+    return completed
+
+
+def _run_job(job, retries: int = 1, timeout: float = None) -> dict:
+    """run a single batch job, retrying failed attempts
+
+    Args:
+        job: archive name, (archivename, inpfile, parfile, datafile) tuple or dict of run arguments
+        retries (int, optional): number of additional attempts after a failure. Defaults to 1.
+        timeout (float, optional): time limit of each attempt in seconds. Defaults to None.
 
+    Returns:
+        dict: archivename, returncode, attempts, elapsed time in seconds and the error of the last attempt
+    """
+    if isinstance(job, dict):
+        kwargs = dict(job)
+    elif isinstance(job, (str, os.PathLike)):
+        kwargs = {"archivename": str(job)}
+    else:
+        kwargs = dict(zip(["archivename", "inpfile", "parfile", "datafile"], job))
+    kwargs.setdefault("timeout", timeout)
+
+    result = {"archivename": kwargs["archivename"], "returncode": None, "attempts": 0, "elapsed": 0., "error": None}
+    start = time.perf_counter()
+    while result["attempts"] <= retries:
+        result["attempts"] += 1
+        try:
+            completed = run(**kwargs)
+            result["returncode"] = completed.returncode
+            result["error"] = None if completed.returncode == 0 else completed.stderr.strip() or f"sammy returned {completed.returncode}"
+        except (OSError, subprocess.SubprocessError) as error:
+            result["error"] = repr(error)
+        if result["error"] is None:
+            break
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+
+def iter_batch(jobs: list, max_workers: int = None, retries: int = 1, timeout: float = None):
+    """run many sammy jobs in parallel and yield their results as they complete
+
+    Every job runs in its own archive directory. The jobs are driven from a thread pool, each thread
+    waiting on its own sammy process, so the sammy runs execute in parallel on max_workers cores.
 
-    # remove SAM*.*
-    filelist = glob.glob(f"{archive_path}/SAM*")
-    for f in filelist:
-        os.remove(f)
+    Args:
+        jobs (list): archive names, (archivename, inpfile, parfile, datafile) tuples or dicts of run arguments
+        max_workers (int, optional): number of concurrent sammy runs. Defaults to the number of CPUs.
+        retries (int, optional): number of additional attempts for a failed job. Defaults to 1.
+        timeout (float, optional): time limit of each attempt in seconds. Defaults to None.
+
+    Yields:
+        dict: job result, see _run_job
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
 
-    return
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_run_job, job, retries, timeout) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def run_batch(jobs: list, max_workers: int = None, retries: int = 1,
+              timeout: float = None, verbose: bool = False) -> dict:
+    """run many sammy jobs in parallel, see iter_batch
+
+    Args:
+        jobs (list): archive names, (archivename, inpfile, parfile, datafile) tuples or dicts of run arguments
+        max_workers (int, optional): number of concurrent sammy runs. Defaults to the number of CPUs.
+        retries (int, optional): number of additional attempts for a failed job. Defaults to 1.
+        timeout (float, optional): time limit of each attempt in seconds. Defaults to None.
+        verbose (bool, optional): print each result as it completes. Defaults to False.
+
+    Returns:
+        dict: job results keyed by archive name
+    """
+    results = {}
+    for result in iter_batch(jobs, max_workers=max_workers, retries=retries, timeout=timeout):
+        results[result["archivename"]] = result
+        if verbose:
+            status = "done" if result["error"] is None else f"failed ({result['error']})"
+            print(f"{result['archivename']}: {status} in {result['elapsed']:.2f} s after {result['attempts']} attempt(s)")
+    return results
+
+
+def _default_semaphore() -> asyncio.Semaphore:
+    """return the semaphore limiting the concurrent runs of the running event loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _SEMAPHORES:
+        _SEMAPHORES[loop] = asyncio.Semaphore(MAX_CONCURRENT_RUNS)
+    return _SEMAPHORES[loop]
+
+
+async def _run_sammy_async(archive_path: pathlib.Path, outputfile: str, input_files: list,
+                           timeout: float = None) -> subprocess.CompletedProcess:
+    """coroutine version of _run_sammy"""
+    stdin = "".join(f"{filename}\n" for filename in input_files) + "\n"
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(SAMMY_EXECUTABLE, cwd=archive_path,
+                                                   stdin=asyncio.subprocess.PIPE,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(stdin.encode()), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(SAMMY_EXECUTABLE, timeout)
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+
+    completed = subprocess.CompletedProcess([SAMMY_EXECUTABLE], process.returncode, stdout.decode(), stderr.decode())
+    # the resource usage of the child is not available from the asyncio child watcher
+    completed.usage = {"wall_time": time.perf_counter() - start, "user_time": None, "system_time": None,
+                       "cpu_time": None, "max_rss_bytes": None}
+    with open(archive_path / outputfile, "w") as fid:
+        fid.write(completed.stdout)
+    return completed
+
+
+async def run_async(archivename: str="example",
+                    inpfile: str = "",
+                    parfile: str = "",
+                    datafile: str = "",
+                    timeout: float = None,
+                    semaphore: asyncio.Semaphore = None,
+                    cache: ResultCache = None,
+                    staging: str = None,
+                    scratch=None) -> subprocess.CompletedProcess:
+    """coroutine version of run, which does not block the event loop while sammy runs
+
+    Staging the archive and collecting the results run in the default executor of the loop.
+
+    Args:
+        archivename (str): archive directory name, see run
+        inpfile (str, optional): input file name
+        parfile (str, optional): parameter file name
+        datafile (str, optional): data file name
+        timeout (float, optional): time limit of the sammy run in seconds. Defaults to None.
+        semaphore (asyncio.Semaphore, optional): limits the number of concurrent runs. Defaults to a
+                                                 semaphore of MAX_CONCURRENT_RUNS shared by the event loop.
+        cache (ResultCache, optional): result cache, see run. Defaults to RESULT_CACHE.
+        staging (str, optional): how the input files are placed into the archive, see run. Defaults to STAGING_MODE.
+        scratch (str, optional): scratch directory to execute sammy in, see run. Defaults to SCRATCH_DIR.
+
+    Returns:
+        subprocess.CompletedProcess: the finished sammy process
+    """
+    cache = RESULT_CACHE if cache is None else cache
+    loop = asyncio.get_running_loop()
+    async with semaphore or _default_semaphore():
+        timings = {}
+        start = time.perf_counter()
+        archive_path, input_files = await loop.run_in_executor(None, _stage_run, archivename, inpfile, parfile, datafile, staging)
+        key, cached = await loop.run_in_executor(None, _cache_lookup, cache, archive_path, archivename, input_files)
+        timings["stage"] = time.perf_counter() - start
+        if cached:
+            timings["total"] = timings["stage"]
+            await loop.run_in_executor(None, functools.partial(_write_run_stats, archive_path, archivename, input_files,
+                                                               cached, timings, cached=True))
+            return cached
+
+        scratch_root = _scratch_root(scratch)
+        run_path = archive_path
+        if scratch_root:
+            run_path = await loop.run_in_executor(None, _stage_scratch, archive_path, archivename, input_files, scratch_root)
+        timings["stage"] = time.perf_counter() - start
+
+        try:
+            completed = await _run_sammy_async(run_path, f'{archivename}.out', input_files, timeout=timeout)
+            timings["sammy"] = completed.usage["wall_time"]
+
+            collect_start = time.perf_counter()
+            await loop.run_in_executor(None, _collect_results, run_path, archivename)
+            if scratch_root:
+                await loop.run_in_executor(None, _collect_scratch, run_path, archive_path, archivename)
+        finally:
+            if scratch_root:
+                await loop.run_in_executor(None, functools.partial(shutil.rmtree, run_path, ignore_errors=True))
+        await loop.run_in_executor(None, _cache_store, cache, key, completed, archive_path, archivename)
+        timings["collect"] = time.perf_counter() - collect_start
+        timings["total"] = time.perf_counter() - start
+        await loop.run_in_executor(None, _write_run_stats, archive_path, archivename, input_files, completed, timings)
+    return completed
@@ -10,11 +10,18 @@ import pandas
 import pathlib
 import re
 import os
+import threading
 
-from pleiades import sammyParFile, sammyInput, sammyRunner, nucData
+from pleiades import sammyParFile, sammyInput, sammyRunner, nucData, sammyData, endfData
 
 PWD = pathlib.Path(__file__).parent
 
+# serializes writes to the params.store shelve of concurrent fits
+_STORE_LOCK = threading.Lock()
+
+# persistent cache of the par files generated from ENDF data, see par_from_endf
+ENDF_PAR_CACHE_DIR = Path.home() / ".cache" / "pleiades" / "endf"
+
 
 def sammy_background(energy: np.ndarray, normalization: float = 1.0,
                      constant_bg: float = 0.0, one_over_v_bg: float = 0.0,
@@ -59,6 +66,7 @@ def save_transmission_spectrum(
     bg_params: dict = {},
     data_threshold: float = -999,
     resolution_file: str = "FP5_resolution.udp",
+    binary: bool = False,
 ) -> None:
     """
     Calculates and saves transmission data from signal and open-beam spectra.
@@ -86,6 +94,8 @@ def save_transmission_spectrum(
         bg_params (dict, optional): Parameters for the background function (default: {}).
         data_threshold (float, optional): Minimum value for data points (default: -999). Useful to exclude saturation resonances below threshold
         resolution_file (str, optional): Name of the resolution file (default: "FP5_resolution.udp").
+        binary (bool, optional): Save a binary spectrum (`.npy` and `.json`, see `sammyData.save_spectrum`)
+            instead of the twenty format `.dat` file. It is converted when the SAMMY run is staged (default: False).
     """
     # Create output filename with proper extension
     output_filename = Path("archive") / Path(archivename) / Path(archivename).with_suffix(".dat")
@@ -123,22 +133,29 @@ def save_transmission_spectrum(
         {"data": transmission[::-1], "err": uncertainty[::-1], "tof": tof[::-1]},
         index=energy[::-1],
     )
-    filtered_data = data.query("tof > 0 and data > @data_threshold")[["data", "err"]]
-
-    # Create directory for output file (if needed)
-    output_filename.parent.mkdir(parents=True, exist_ok=True)
-
-    # Save filtered data to .dat file
-    np.savetxt(
-        output_filename,
-        filtered_data.reset_index().values,
-        fmt="%19.12f",
-        newline="\n ",
-        header="W data (twenty format)",
-    )
-
-    # Remove the first line (header) using system call (consider alternative)
-    os.system(f"sed -i '1d' {output_filename}")
+    selected_data = data.query("tof > 0 and data > @data_threshold")
+    filtered_data = selected_data[["data", "err"]]
+
+    if binary:
+        # Save filtered data with its TOF and reduction parameters to the binary container
+        sammyData.save_spectrum(
+            output_filename,
+            filtered_data.index.values,
+            filtered_data["data"].values,
+            filtered_data["err"].values,
+            tof=selected_data["tof"].values,
+            metadata={"flight_path_length": flight_path_length, "dt": Δt, "t_zero": t_zero,
+                      "uncertainty_rank": uncertainty_rank, "k": k, "epsilon": ϵ, "scale_bg": scale_bg,
+                      "bg_type": bg_type, "bg_params": bg_params, "data_threshold": data_threshold},
+        )
+    else:
+        # Save filtered data to .dat file (twenty format)
+        sammyData.write_twenty(
+            output_filename,
+            filtered_data.index.values,
+            filtered_data["data"].values,
+            filtered_data["err"].values,
+        )
 
     if resolution_file:
         # Create symbolic link to resolution file (consider alternative)
@@ -166,20 +183,9 @@ def save_transmission_spectrum(
 
 
 
-def sammy_par_from_endf(isotope: str = "U-238", flight_path_length: float = 10.72) -> None:
-    """
-    Generates a SAMMY input file and runs SAMMY with ENDF data to produce a `.par` file
-    for the specified isotope.
-
-    This function creates a SAMMY input file based on a configuration file, modifies relevant
-    cards for the target isotope, saves the input file, and then runs SAMMY with ENDF data
-    to generate the corresponding `.par` file.
-
-    Args:
-        isotope (str, optional): The isotope name (e.g., "U-238"). Defaults to "U-238".
-        flight_path_length (float, optional): The flight path length in meters. Defaults to 10.72.
-    """
-
+def _endf_input(isotope: str, flight_path_length: float = 10.72,
+                emin: float = None, emax: float = None) -> "sammyInput.InputFile":
+    """Creates the SAMMY input of an ENDF to par conversion for an isotope, see sammy_par_from_endf."""
     # Load configuration from a separate file (recommended)
     import nucDataLibs
     sammy_files = Path(nucDataLibs.__file__).parent / "sammyFiles"
@@ -189,42 +195,140 @@ def sammy_par_from_endf(isotope: str = "U-238", flight_path_length: float = 10.7
     # Update input data with isotope-specific information
     inp.data["Card2"]["elmnt"] = isotope
     inp.data["Card2"]["aw"] = "auto"
+    if emin is not None:
+        inp.data["Card2"]["emin"] = emin
+    if emax is not None:
+        inp.data["Card2"]["emax"] = emax
     inp.data["Card5"]["dist"] = flight_path_length
     inp.data["Card5"]["deltag"] = 0.001
     inp.data["Card5"]["deltae"] = 0.001
     inp.data["Card7"]["crfn"] = 0.001
+    return inp.process()
 
-    # Create output filename with proper extension
-    output_filename = sammy_files / Path(isotope.replace("-", "").replace("_", ""))
-    inp.process().write(output_filename.with_suffix(".inp"))
+
+def _endf_inpfile(isotope: str) -> Path:
+    """Returns the path of the ENDF conversion input file of an isotope, inside its run directory"""
+    name = isotope.replace("-", "").replace("_", "")
+    return Path("archive") / name / f"{name}.inp"
+
+
+def sammy_par_from_endf(isotope: str = "U-238", flight_path_length: float = 10.72,
+                        emin: float = None, emax: float = None) -> None:
+    """
+    Generates a SAMMY input file and runs SAMMY with ENDF data to produce a `.par` file
+    for the specified isotope.
+
+    This function creates a SAMMY input file based on a configuration file, modifies relevant
+    cards for the target isotope, saves the input file, and then runs SAMMY with ENDF data
+    to generate the corresponding `.par` file.
+
+    Args:
+        isotope (str, optional): The isotope name (e.g., "U-238"). Defaults to "U-238".
+        flight_path_length (float, optional): The flight path length in meters. Defaults to 10.72.
+        emin (float, optional): Minimal energy of the resonances in eV. Defaults to the configuration value.
+        emax (float, optional): Maximal energy of the resonances in eV. Defaults to the configuration value.
+    """
+    # Create the input file of the isotope directly in its run directory
+    output_filename = _endf_inpfile(isotope)
+    output_filename.parent.mkdir(parents=True, exist_ok=True)
+    _endf_input(isotope, flight_path_length, emin, emax).write(output_filename)
 
     # Run SAMMY with ENDF data to generate .par file
-    sammyRunner.run_endf(inpfile=output_filename.with_suffix(".inp"))
+    sammyRunner.run_endf(inpfile=output_filename)
+
+
+def _endf_digest(inpfile: Path) -> str:
+    """Returns the digest of the ENDF data read by a conversion input: the section of its material if the
+    library can be indexed, the path, modification time and size of the library otherwise."""
+    import hashlib
+    endf_file = Path(endfData.ENDF_FILE)
+    try:
+        return hashlib.sha256(endfData.read_mat(sammyRunner._endf_mat_number(inpfile), endf_file)).hexdigest()
+    except (OSError, KeyError):
+        pass
+    try:
+        stat = endf_file.stat()
+    except OSError:
+        return ""
+    return f"{endf_file.resolve()}:{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def par_from_endf(isotopes: list = ["U-238"], emin: float = None, emax: float = None,
+                  flight_path_length: float = 10.72, max_workers: int = None,
+                  cache_dir: str = ENDF_PAR_CACHE_DIR, timeout: float = None,
+                  cache_max_bytes: int = 256 * 1024**2) -> dict:
+    """
+    Generates the `.par` files of many isotopes from ENDF data, running the SAMMY conversions concurrently.
 
+    The outputs (`.par`, `.inp` and `.lpt` in `archive/<isotope>/results`) are kept in a persistent cache
+    keyed by the hash of the generated input file, which holds the isotope, its MAT number and the energy
+    window, and the hash of the material section of the ENDF file. Isotopes found in the cache are restored
+    without running SAMMY.
 
+    Args:
+        isotopes (list, optional): isotope names (e.g., ["U-238", "U-235"]). Defaults to ["U-238"].
+        emin (float, optional): Minimal energy of the resonances in eV. Defaults to the configuration value.
+        emax (float, optional): Maximal energy of the resonances in eV. Defaults to the configuration value.
+        flight_path_length (float, optional): The flight path length in meters. Defaults to 10.72.
+        max_workers (int, optional): Number of concurrent SAMMY runs. Defaults to the number of CPUs.
+        cache_dir (str, optional): Cache directory, None disables the cache. Defaults to ENDF_PAR_CACHE_DIR.
+        timeout (float, optional): Time limit of each SAMMY run in seconds. Defaults to None.
+        cache_max_bytes (int, optional): Size limit of the cache, least recently used entries are evicted. Defaults to 256 MB.
 
-def run_sammy_fit(archivename: str="UMo",
-                  abundances: dict={"U238":0.7,"U235":0.3},
-                  emin: float=1.,
-                  emax: float=50.,
-                  res_emin: float=None,
-                  res_emax: float=None,
-                  vary_abundances: bool=False,
-                  vary_normalization: bool=None,
-                  vary_broadening: bool=None,
-                  vary_misc: bool=None,
-                  vary_resonance_energies: bool=None,
-                  vary_gamma_widths: bool=None,
-                  vary_neutron_widths: bool=None,
-                  vary_resonances_emin: float=None,
-                  vary_resonances_emax: float=None,
-                  params:dict={},
-                  fudge_factor: float=0.5,
-                  flight_path_length: float=10.7,
-                  atomic_weight:float=None,
-                  commands: set=set(),
-                  ) -> dict:
-    """automatically runs sammy
+    Returns:
+        dict: path of the generated `.par` file of each isotope
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import hashlib
+
+    cache = sammyRunner.ResultCache(cache_dir, cache_max_bytes) if cache_dir is not None else None
+
+    def convert(isotope):
+        inpfile = _endf_inpfile(isotope)
+        inpfile.parent.mkdir(parents=True, exist_ok=True)
+        _endf_input(isotope, flight_path_length, emin, emax).write(inpfile)
+        results = Path("archive") / inpfile.stem / "results"
+        outputs = {suffix: results / f"{inpfile.stem}.{suffix}" for suffix in ["par", "inp", "lpt"]}
+
+        key = None
+        if cache is not None:
+            key = hashlib.sha256(inpfile.read_bytes() + _endf_digest(inpfile).encode()).hexdigest()
+            results.mkdir(parents=True, exist_ok=True)
+            if (cache.directory / key / "par").exists() and cache.restore_files(key, outputs):
+                return outputs["par"]
+
+        sammyRunner.run_endf(inpfile=inpfile, timeout=timeout)
+
+        if key is not None:
+            cache.store_files(key, outputs)
+        return outputs["par"]
+
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        return dict(zip(isotopes, executor.map(convert, isotopes)))
+
+
+def prepare_sammy_fit(archivename: str="UMo",
+                      abundances: dict={"U238":0.7,"U235":0.3},
+                      emin: float=1.,
+                      emax: float=50.,
+                      res_emin: float=None,
+                      res_emax: float=None,
+                      vary_abundances: bool=False,
+                      vary_normalization: bool=None,
+                      vary_broadening: bool=None,
+                      vary_misc: bool=None,
+                      vary_resonance_energies: bool=None,
+                      vary_gamma_widths: bool=None,
+                      vary_neutron_widths: bool=None,
+                      vary_resonances_emin: float=None,
+                      vary_resonances_emax: float=None,
+                      params:dict={},
+                      fudge_factor: float=0.5,
+                      flight_path_length: float=10.7,
+                      atomic_weight:float=None,
+                      commands: set=set(),
+                      ) -> tuple:
+    """prepares the archive of a sammy fit: writes the compound par file and the inp file
 
     Args:
         archivename (str, optional): the directory name to run. Defaults to "UMo".
@@ -245,9 +349,9 @@ def run_sammy_fit(archivename: str="UMo",
         commands (set, optional): update the default commands with additional commands. Use the '~SOLVE_BAYES` notation to remove default commands. Defaults to set().
 
     Returns:
-        dict: samyOutput.LptFile.stats outout
+        tuple: the archive name and the data file name to run sammy with
     """
-    # runs a UMo fit and returns the simulation stats
+    # prepares a UMo fit
     from pathlib import Path
 
     archivename = Path(archivename)
@@ -358,11 +462,27 @@ def run_sammy_fit(archivename: str="UMo",
     # write the inp file
     inp.process(auto_update=False).write("archive" / archivename / archivename.with_suffix(".inp"))
     
-    # run sammy, it saves the results inside the "./archive/W/results" directory
-    sammyRunner.run(archivename=archivename.stem,
-                    inpfile=archivename.with_suffix(".inp"),
-                    parfile=archivename.with_suffix(".par"),
-                    datafile=archivename.with_suffix(".dat"))
+    # use a binary spectrum if no twenty format data file was saved
+    datafile = archivename.with_suffix(".dat")
+    if not ("archive" / archivename / datafile).exists() and ("archive" / archivename / archivename.with_suffix(".npy")).exists():
+        datafile = archivename.with_suffix(".npy")
+
+    return archivename, datafile
+
+
+def parse_sammy_fit(archivename: str="UMo", abundances: dict={"U238":0.7,"U235":0.3}) -> dict:
+    """reads the stats of a finished sammy fit from its lpt file and stores them in params.store
+
+    Args:
+        archivename (str, optional): the directory name of the fit. Defaults to "UMo".
+        abundances (dict, optional): dictionary of the fitted isotope names. Defaults to {"U238":0.7,"U235":0.3}.
+
+    Returns:
+        dict: samyOutput.LptFile.stats outout
+    """
+    from pathlib import Path
+
+    archivename = Path(archivename)
 
     from pleiades import sammyOutput
     output = sammyOutput.LptFile("archive" / Path(archivename.stem) / "results" / Path(archivename.stem).with_suffix(".lpt"))
@@ -376,12 +496,121 @@ def run_sammy_fit(archivename: str="UMo",
     
     # save to shelve
     import shelve
-    with shelve.open("params.store") as fid:
+    with _STORE_LOCK, shelve.open("params.store") as fid:
         fid[f"{archivename}/latest"] = stats
     
     return stats
 
 
+def run_sammy_fit(archivename: str="UMo",
+                  abundances: dict={"U238":0.7,"U235":0.3},
+                  emin: float=1.,
+                  emax: float=50.,
+                  res_emin: float=None,
+                  res_emax: float=None,
+                  vary_abundances: bool=False,
+                  vary_normalization: bool=None,
+                  vary_broadening: bool=None,
+                  vary_misc: bool=None,
+                  vary_resonance_energies: bool=None,
+                  vary_gamma_widths: bool=None,
+                  vary_neutron_widths: bool=None,
+                  vary_resonances_emin: float=None,
+                  vary_resonances_emax: float=None,
+                  params:dict={},
+                  fudge_factor: float=0.5,
+                  flight_path_length: float=10.7,
+                  atomic_weight:float=None,
+                  commands: set=set(),
+                  ) -> dict:
+    """automatically runs sammy
+
+    Args:
+        archivename (str, optional): the directory name to run. Defaults to "UMo".
+        abundances (_type_, optional): dictionary of isotope name keys and guess abundences. Defaults to {"U238":0.7,"U235":0.3}.
+        emin (float, optional): minimal energy. Defaults to 1.
+        emax (float, optional): maximal energy. Defaults to 50.
+        res_emin (float, optional): minimal energy for resonance parameters. Defaults to 1.
+        res_emax (float, optional): maximal energy for resonance parameters. Defaults to 1.
+        vary_abundances (bool, optional): True will vary all abundances parameters. Defaults to False.
+        vary_normalization (bool, optional): True will vary all normalization parameters. Defaults to False.
+        vary_broadening (bool, optional): True will vary all broadening parameters. Defaults to False.
+        vary_misc (bool, optional): True will vary all misc parameters. Defaults to False.
+        vary_resonances_emin (float): the lower energy of resonances to toggle vary flag
+        vary_resonances_emax (float): the upper energy of resonances to toggle vary flag
+        params (dict, optional): dictionary of all normalization and broadening params. Defaults to {}.
+        fudge_factor (float, optional): fudge factor, controls the uncertainty of the fit params search. Defaults to 0.5.
+        atomic_weight (float, optional): supply the compound atomic weight, if None the atomic weight is guessed from the abundances input. Defaults to None.
+        commands (set, optional): update the default commands with additional commands. Use the '~SOLVE_BAYES` notation to remove default commands. Defaults to set().
+
+    Returns:
+        dict: samyOutput.LptFile.stats outout
+    """
+    archivename, datafile = prepare_sammy_fit(archivename=archivename,
+                                              abundances=abundances,
+                                              emin=emin,
+                                              emax=emax,
+                                              res_emin=res_emin,
+                                              res_emax=res_emax,
+                                              vary_abundances=vary_abundances,
+                                              vary_normalization=vary_normalization,
+                                              vary_broadening=vary_broadening,
+                                              vary_misc=vary_misc,
+                                              vary_resonance_energies=vary_resonance_energies,
+                                              vary_gamma_widths=vary_gamma_widths,
+                                              vary_neutron_widths=vary_neutron_widths,
+                                              vary_resonances_emin=vary_resonances_emin,
+                                              vary_resonances_emax=vary_resonances_emax,
+                                              params=params,
+                                              fudge_factor=fudge_factor,
+                                              flight_path_length=flight_path_length,
+                                              atomic_weight=atomic_weight,
+                                              commands=commands)
+
+    # run sammy, it saves the results inside the "./archive/W/results" directory
+    sammyRunner.run(archivename=archivename.stem,
+                    inpfile="archive" / archivename / archivename.with_suffix(".inp"),
+                    parfile="archive" / archivename / archivename.with_suffix(".par"),
+                    datafile="archive" / archivename / datafile)
+
+    return parse_sammy_fit(archivename, abundances)
+
+
+async def run_sammy_fit_async(archivename: str="UMo",
+                              abundances: dict={"U238":0.7,"U235":0.3},
+                              timeout: float=None,
+                              semaphore=None,
+                              **kwargs) -> dict:
+    """coroutine version of run_sammy_fit, which does not block the event loop
+
+    The archive is prepared and the lpt file is parsed in the default executor of the loop,
+    and sammy runs through sammyRunner.run_async.
+
+    Args:
+        archivename (str, optional): the directory name to run. Defaults to "UMo".
+        abundances (dict, optional): dictionary of isotope name keys and guess abundences. Defaults to {"U238":0.7,"U235":0.3}.
+        timeout (float, optional): time limit of the sammy run in seconds. Defaults to None.
+        semaphore (asyncio.Semaphore, optional): limits the number of concurrent sammy runs, see sammyRunner.run_async
+        **kwargs: the other fit options of run_sammy_fit
+
+    Returns:
+        dict: samyOutput.LptFile.stats outout
+    """
+    import asyncio
+    import functools
+
+    loop = asyncio.get_running_loop()
+    archivename, datafile = await loop.run_in_executor(None, functools.partial(prepare_sammy_fit, archivename=archivename,
+                                                                               abundances=abundances, **kwargs))
+    await sammyRunner.run_async(archivename=archivename.stem,
+                                inpfile="archive" / archivename / archivename.with_suffix(".inp"),
+                                parfile="archive" / archivename / archivename.with_suffix(".par"),
+                                datafile="archive" / archivename / datafile,
+                                timeout=timeout,
+                                semaphore=semaphore)
+    return await loop.run_in_executor(None, parse_sammy_fit, archivename, abundances)
+
+
 
 def plot_transmission(archivename: str="W", stats: dict ={},
                         plot_bg: bool=True,
@@ -548,7 +777,7 @@ def print_stats_table(stats: dict, just_params:bool = True,
 
 import numpy as np
 SPEED_OF_LIGHT = 299792458 # m/s
-MASS_OF_NEUTRON = 939.56542052 * 1e6 / (SPEED_OF_LIGHT) ** 2  # [eV s²/m²]
+MASS_OF_NEUTRON = nucData.NEUTRON_MASS * nucData.ATOMIC_MASS_UNIT_EV / (SPEED_OF_LIGHT) ** 2  # [eV s²/m²]
 
 TOF_LABEL = "Time-of-flight [μs]"
 ENERGY_LABEL = "Energy [eV]"
@@ -1,114 +1,703 @@
 import re, os
+import io
+import hashlib
+import json
+import pathlib
 import configparser
+import threading
+from collections import OrderedDict
 import numpy as np
 from scipy.interpolate import interp1d
+from scipy.signal import fftconvolve, oaconvolve
 import pleiades.nucData as pnd
+import pleiades.sammyData as sammyData
+from pleiades.endfData import endf_float
 
 AVOGADRO = 6.02214076E23    # Avogadro's number
 CM2_TO_BARN = 1E24          # Conversion factor from cm2 to barns
+BOLTZMANN = 8.617333262E-5  # Boltzmann constant in eV/K
 
-def create_transmission(energy_grid, isotope):
-    """Create the transmission data for the given material based on interpolation of the cross-section data and the energy grid for a given material thickness and density. This uses the the attenuation formula: T = e^(-sigma * A) where sigma is the cross-section, and A is the areal density, which is in units of atoms/barn.
+def areal_density(isotope):
+    """Calculate the areal density of an isotope in atoms/barn from its thickness, density, atomic mass and abundance.
 
     Args:
-        xs_data (tuple array): list of tuples containing the energy and cross-section data
-        thickness (float): thickness of the material
-        thickness_unit (string): unit of the thickness for the given material
-        density (float): density of the material
-        density_unit (string): unit of the density for the given material
-    
+        isotope (Isotope): Isotope object with thickness, density, atomic mass and abundance information
+
+    Raises:
+        ValueError: If the thickness or density units are not supported
+
     Returns:
-        transmission (tuple array): list of tuples containing the energy and transmission data
+        float: areal density in atoms/barn
     """
-    
-    # Extract information from the isotope object
-    thickness = isotope.thickness
-    atomic_mass = isotope.atomic_mass
+    return _areal_density(isotope, isotope.thickness, isotope.density) * isotope.abundance
+
+
+def _areal_density(isotope, thickness, density):
+    """areal density in atoms/barn of (arrays of) thicknesses and densities given in the units of the isotope, without its abundance"""
     thickness_unit = isotope.thickness_unit
-    density = isotope.density
     density_unit = isotope.density_unit
-    xs_data = isotope.xs_data
-    
+
     if thickness_unit != "cm":
         if thickness_unit == "mm":
-            thickness /= 10.0
+            thickness = thickness / 10.0
         else:
-            raise ValueError("Unsupported thickness unit: {thickness_unit} for {isotope_name}")
+            raise ValueError(f"Unsupported thickness unit: {thickness_unit} for {isotope.name}")
     if density_unit != "g/cm3":
-        raise ValueError("Unsupported density unit:{density_unit} for {isotope_name}")
+        raise ValueError(f"Unsupported density unit:{density_unit} for {isotope.name}")
 
-    # Calculate the areal density
-    areal_density = thickness * density * AVOGADRO / atomic_mass / CM2_TO_BARN 
-    
-    # Create interpolation function for cross-section data
-    energies_eV, cross_sections = zip(*xs_data)
+    return thickness * density * AVOGADRO / isotope.atomic_mass / CM2_TO_BARN
+
+
+def interpolate_xs(energy_grid, xs_data):
+    """Linearly interpolate (and extrapolate) cross-section data onto an energy grid in a single vectorized call.
+
+    Args:
+        energy_grid (array): energies in eV
+        xs_data (array): (M,2) array or list of tuples containing the energy and cross-section data
+
+    Returns:
+        np.ndarray: cross-sections on the energy grid
+    """
+    energies_eV, cross_sections = np.asarray(xs_data, dtype=float).T
     interpolate_xs_data = interp1d(energies_eV, cross_sections, kind='linear', fill_value="extrapolate")
+    return interpolate_xs_data(np.asarray(energy_grid, dtype=float))
+
+
+def calculate_transmission(energy_grid, isotope):
+    """Calculate the transmission of an isotope on an energy grid using the attenuation formula: T = e^(-sigma * A) where sigma is the cross-section, and A is the areal density, which is in units of atoms/barn.
+
+    Args:
+        energy_grid (array): energies in eV
+        isotope (Isotope): Isotope object with loaded cross-section data
+
+    Returns:
+        np.ndarray: transmission on the energy grid
+    """
+    return np.exp(-interpolate_xs(energy_grid, isotope.xs_data) * areal_density(isotope))
+
+
+def calculate_transmission_sweep(energy_grid, isotope, areal_densities=None, thicknesses=None, densities=None):
+    """Calculate the transmission of an isotope for many areal densities in a single vectorized call.
+
+    The cross-section is interpolated once and broadcast over the areal densities. Instead of areal densities,
+    thickness and density arrays in the units of the isotope may be given, they are broadcast against each other.
+    As in areal_density, the areal densities computed from thicknesses are scaled by the isotope abundance.
+
+    Args:
+        energy_grid (array): energies in eV
+        isotope (Isotope): Isotope object with loaded cross-section data
+        areal_densities (array, optional): areal densities of the isotope in atoms/barn, used as given
+        thicknesses (array, optional): thicknesses in the isotope thickness_unit, used if areal_densities is not given
+        densities (array, optional): densities in the isotope density_unit. Defaults to the isotope density.
+
+    Raises:
+        ValueError: If neither areal_densities nor thicknesses are given
+
+    Returns:
+        np.ndarray: transmission array of shape areal_densities.shape + energy_grid.shape
+    """
+    if areal_densities is None:
+        if thicknesses is None:
+            raise ValueError("Either areal_densities or thicknesses must be given")
+        if densities is None:
+            densities = isotope.density
+        thicknesses, densities = np.broadcast_arrays(np.asarray(thicknesses, dtype=float), np.asarray(densities, dtype=float))
+        areal_densities = _areal_density(isotope, thicknesses, densities) * isotope.abundance
+
+    cross_sections = interpolate_xs(energy_grid, isotope.xs_data)
+    return np.exp(-np.multiply.outer(np.asarray(areal_densities, dtype=float), cross_sections))
+
+
+def calculate_attenuation(energy_grid, isotopes, temperature=None):
+    """Calculate the N x M attenuation matrix n*sigma for N isotopes on an energy grid of M points.
+
+    The areal density n of each isotope is scaled by its abundance, see areal_density.
+
+    Args:
+        energy_grid (array): energies in eV
+        isotopes (list): list of Isotope objects with loaded cross-section data
+        temperature (float, optional): sample temperature in K, if given the cross-sections are Doppler broadened
+
+    Returns:
+        np.ndarray: (N,M) attenuation matrix
+    """
+    energy_grid = np.asarray(energy_grid, dtype=float)
+    attenuation = np.empty((len(isotopes), len(energy_grid)))
+    for row, isotope in enumerate(isotopes):
+        attenuation[row] = interpolate_xs(energy_grid, isotope.xs_data)
+        if temperature:
+            attenuation[row] = doppler_broaden(energy_grid, attenuation[row], temperature, isotope.atomic_mass)
+
+    number_densities = np.array([areal_density(isotope) for isotope in isotopes])
+    attenuation *= number_densities[:, np.newaxis]
+    return attenuation
+
+
+def calculate_transmission_matrix(energy_grid, isotopes, temperature=None):
+    """Calculate the per-isotope and combined transmission of a multi-isotope sample in one batched pass.
+
+    The combined transmission is T = exp(-sum_i n_i * sigma_i), where n_i is the areal density of isotope i
+    scaled by its abundance.
+
+    Args:
+        energy_grid (array): energies in eV
+        isotopes (list): list of Isotope objects with loaded cross-section data
+        temperature (float, optional): sample temperature in K, if given the cross-sections are Doppler broadened
+
+    Returns:
+        tuple: (N,M) per-isotope transmission array and (M,) combined transmission array
+    """
+    attenuation = calculate_attenuation(energy_grid, isotopes, temperature)
+    combined_transmission = np.exp(-attenuation.sum(axis=0))
+    transmissions = np.exp(-attenuation, out=attenuation)
+    return transmissions, combined_transmission
+
+
+def _convolve_uniform(values, kernel):
+    """FFT convolution of values sampled on a uniform grid with a kernel centered on its middle sample.
+    The values are padded with their edge values, so the result does not drop off at the grid limits.
+    Overlap-add keeps the transforms at the size of the kernel instead of the whole grid."""
+    kernel = kernel / kernel.sum()
+    pad = len(kernel) // 2
+    padded = np.pad(values, pad, mode="edge")
+    return oaconvolve(padded, kernel, mode="same")[pad:pad+len(values)]
+
+
+def _uniform_points(x_min, x_max, size, width, points=None):
+    """Number of points of a uniform grid spanning [x_min, x_max] that resolves a kernel of the given width"""
+    if points is None:
+        points = max(size, int(np.ceil((x_max - x_min) / (width / 4.))) + 1)
+    return points
+
+
+def _interpolation_weights(xp, x):
+    """Indices into the sorted points xp and weights that linearly interpolate onto x, like np.interp"""
+    index = np.clip(np.searchsorted(xp, x, side="right") - 1, 0, len(xp) - 2)
+    spacing = xp[index + 1] - xp[index]
+    weight = np.divide(x - xp[index], spacing, out=np.zeros_like(x), where=spacing > 0)
+    return index, np.clip(weight, 0., 1.)
+
+
+class _UniformMapping:
+    """Linear interpolation between sorted points x and a uniform grid spanning them, in both directions.
+    The interpolation indices and weights are computed once, so that they can be reused for many spectra."""
+    def __init__(self, x, points):
+        self.grid = np.linspace(x[0], x[-1], points)
+        self.step = self.grid[1] - self.grid[0]
+        self._to_grid = _interpolation_weights(x, self.grid)
+        self._from_grid = _interpolation_weights(self.grid, x)
+
+    @staticmethod
+    def _apply(values, index, weight):
+        lower = values[index]
+        return lower + (values[index + 1] - lower) * weight
+
+    def to_grid(self, values):
+        return self._apply(values, *self._to_grid)
+
+    def from_grid(self, values):
+        return self._apply(values, *self._from_grid)
+
+
+# uniform grid mappings of the energy grids broadened most recently, keyed by the grid content
+_MAPPINGS = OrderedDict()
+_MAPPINGS_SIZE = 4
+_MAPPINGS_LOCK = threading.Lock()
+
+
+def _grid_key(energy_grid):
+    """Digest of the content of an energy grid"""
+    return hashlib.blake2b(np.ascontiguousarray(energy_grid).data, digest_size=16).digest()
+
+
+def _uniform_mapping(grid_key, variable, x, points):
+    """Cached _UniformMapping of the variable x (e.g. "sqrt(E)") of the energy grid with the digest grid_key"""
+    key = (grid_key, variable, points)
+    with _MAPPINGS_LOCK:
+        if key in _MAPPINGS:
+            _MAPPINGS.move_to_end(key)
+            return _MAPPINGS[key]
+    mapping = _UniformMapping(x, points)
+    with _MAPPINGS_LOCK:
+        _MAPPINGS[key] = mapping
+        while len(_MAPPINGS) > _MAPPINGS_SIZE:
+            _MAPPINGS.popitem(last=False)
+    return mapping
+
+
+def _sort_order(x):
+    """Index that sorts x, a slice for the usual monotonic grids"""
+    if np.all(x[1:] >= x[:-1]):
+        return slice(None)
+    if np.all(x[1:] <= x[:-1]):
+        return slice(None, None, -1)
+    return np.argsort(x)
+
+
+def doppler_broaden(energy_grid, cross_section, temperature, atomic_mass, points=None):
+    """Doppler broaden a cross-section with the free-gas model in its Gaussian (high energy) approximation.
+
+    In terms of u = sqrt(E) the free-gas Doppler kernel is a Gaussian of constant width sqrt(kT m/M), so the
+    cross-section is resampled on a uniform sqrt(E) grid and convolved with a single FFT.
+
+    Args:
+        energy_grid (array): energies in eV
+        cross_section (array): cross-section on the energy grid
+        temperature (float): sample temperature in K
+        atomic_mass (float): atomic mass of the isotope in amu
+        points (int, optional): number of points of the uniform sqrt(E) grid. Defaults to a grid that resolves the kernel.
+
+    Returns:
+        np.ndarray: Doppler broadened cross-section on the energy grid
+    """
+    energy_grid = np.asarray(energy_grid, dtype=float)
+    order = _sort_order(energy_grid)
+    u = np.sqrt(energy_grid[order])
+
+    # Doppler width in sqrt(E), the kernel is exp(-(du/width)^2)
+    width = np.sqrt(BOLTZMANN * temperature * pnd.NEUTRON_MASS / atomic_mass)
+
+    mapping = _uniform_mapping(_grid_key(energy_grid), "sqrt(E)", u, _uniform_points(u[0], u[-1], len(u), width, points))
+    offsets = np.arange(-np.ceil(4*width/mapping.step), np.ceil(4*width/mapping.step) + 1) * mapping.step
+    kernel = np.exp(-(offsets/width)**2)
+
+    broadened = _convolve_uniform(mapping.to_grid(np.asarray(cross_section, dtype=float)[order]), kernel)
+
+    result = np.empty_like(energy_grid)
+    result[order] = mapping.from_grid(broadened)
+    return result
+
+
+def resolution_broaden(energy_grid, transmission, flight_path_length, flight_path_spread=0., deltag_fwhm=0., deltae_us=0., points=None):
+    """Broaden a transmission spectrum with a time-of-flight resolution function.
+
+    The resolution function follows the broadening parameters of sammyParFile (Update.broadening): a Gaussian
+    flight-path spread, a Gaussian timing spread and an exponential tail. The flight-path spread is a constant
+    relative time spread and is applied on a uniform log(TOF) grid, the timing terms on a uniform TOF grid,
+    each as a single FFT convolution. The mappings onto the uniform grids are cached per energy grid.
+
+    Args:
+        energy_grid (array): energies in eV
+        transmission (array): transmission on the energy grid
+        flight_path_length (float): flight path length in m
+        flight_path_spread (float, optional): Gaussian spread (standard deviation) of the flight path in m (DELTAL)
+        deltag_fwhm (float, optional): FWHM of the Gaussian timing spread in us (DELTAG)
+        deltae_us (float, optional): e-folding time of the exponential tail in us (DELTAE)
+        points (int, optional): number of points of the uniform grids. Defaults to grids that resolve the kernels.
+
+    Returns:
+        np.ndarray: broadened transmission on the energy grid
+    """
+    from pleiades.sammyUtils import energy2time
+
+    energy_grid = np.asarray(energy_grid, dtype=float)
+    # the time of flight decreases with energy
+    order = _sort_order(-energy_grid)
+    broadened = np.asarray(transmission, dtype=float)[order]
+
+    tof = energy2time(energy_grid[order], flight_path_length) * 1E6 # us
+    grid_key = _grid_key(energy_grid)
+
+    if flight_path_spread:
+        width = flight_path_spread / flight_path_length
+        log_tof = np.log(tof)
+        mapping = _uniform_mapping(grid_key, ("log(TOF)", flight_path_length), log_tof,
+                                   _uniform_points(log_tof[0], log_tof[-1], len(tof), width, points))
+        step = mapping.step
+        offsets = np.arange(-np.ceil(4*width/step), np.ceil(4*width/step) + 1) * step
+        kernel = np.exp(-0.5*(offsets/width)**2)
+        broadened = mapping.from_grid(_convolve_uniform(mapping.to_grid(broadened), kernel))
+
+    if deltag_fwhm or deltae_us:
+        sigma = deltag_fwhm / (2*np.sqrt(2*np.log(2)))
+        width = max(sigma, deltae_us)
+        mapping = _uniform_mapping(grid_key, ("TOF", flight_path_length), tof,
+                                   _uniform_points(tof[0], tof[-1], len(tof), width, points))
+        step = mapping.step
+        extent = np.ceil((4*sigma + 8*deltae_us) / step)
+        offsets = np.arange(-extent, extent + 1) * step
+
+        kernel = np.exp(-0.5*(offsets/sigma)**2) if sigma else (offsets == 0).astype(float)
+        if deltae_us:
+            # the exponential tail only delays the measured time of flight
+            tail = np.where(offsets >= 0, np.exp(-offsets/deltae_us), 0.)
+            kernel = fftconvolve(kernel, tail, mode="same")
+        broadened = mapping.from_grid(_convolve_uniform(mapping.to_grid(broadened), kernel))
+
+    result = np.empty_like(energy_grid)
+    result[order] = broadened
+    return result
+
+
+def broadening_from_parfile(parfile):
+    """Collect the resolution broadening parameters of a sammyParFile.ParFile as floats.
+
+    The temperature is meant for calculate_transmission_matrix, the other parameters for resolution_broaden.
+
+    Args:
+        parfile (ParFile): ParFile instance (after read)
+
+    Returns:
+        dict: temperature, flight_path_spread, deltag_fwhm and deltae_us, unset values are omitted
+    """
+    params = {}
+    for key in ["temperature", "flight_path_spread", "deltag_fwhm", "deltae_us"]:
+        value = str(parfile.data.get("broadening", {}).get(key, "")).strip()
+        if value:
+            params[key] = float(value)
+    return params
+
+
+def _resonance_parameters(parfile):
+    """Energies and total widths in eV of the resonances of a ParFile"""
+    energies, widths = [], []
+    for card in parfile.data["resonance_params"]:
+        energies.append(endf_float(card["reosnance_energy"]))
+        # resonance widths are given in meV
+        widths.append(sum(endf_float(card[key]) for key in ["capture_width", "neutron_width", "fission1_width", "fission2_width"]) * 1E-3)
+    return np.array(energies), np.abs(np.array(widths))
+
+
+def _resonance_profile(parfile, energy_grid, chunk_size=256):
+    """Sum of unit-height single-level Breit-Wigner (Lorentzian) line shapes of the ParFile resonances on an
+    energy grid, evaluated a chunk of resonances at a time"""
+    energies, widths = _resonance_parameters(parfile)
+    energies, half_widths = energies[widths > 0], 0.5 * widths[widths > 0]
+    profile = np.zeros(len(energy_grid))
+    for start in range(0, len(energies), chunk_size):
+        detuning = energy_grid[:, np.newaxis] - energies[np.newaxis, start:start+chunk_size]
+        gamma2 = half_widths[np.newaxis, start:start+chunk_size]**2
+        profile += np.sum(gamma2 / (detuning**2 + gamma2), axis=1)
+    return profile
+
+
+def resonance_energy_points(parfile, energy_min, energy_max, points_per_resonance=41, extent=50.):
+    """Energy points clustered around the resonances of a sammyParFile.ParFile.
+
+    The points are placed with a Lorentzian-adapted spacing, E_r + Gamma/2 * tan(theta) with theta uniform, which
+    resolves a resonance of total width Gamma out to extent half-widths from its center.
 
-    # create a list of tuples containing the energy and transmission data
-    transmission = []
-    interploated_cross_section = []
+    Args:
+        parfile (ParFile): ParFile instance (after read)
+        energy_min (float): minimal energy in eV
+        energy_max (float): maximal energy in eV
+        points_per_resonance (int, optional): number of points per resonance. Defaults to 41.
+        extent (float, optional): number of half-widths covered on each side of a resonance. Defaults to 50.
+
+    Returns:
+        np.ndarray: sorted energy points in eV within the energy limits
+    """
+    energies, widths = _resonance_parameters(parfile)
+    if not len(energies):
+        return np.array([])
+
+    theta = np.linspace(-np.arctan(extent), np.arctan(extent), points_per_resonance)
+    points = energies[:, np.newaxis] + 0.5 * widths[:, np.newaxis] * np.tan(theta)
+    points = points.ravel()
+    return np.unique(points[(points >= energy_min) & (points <= energy_max)])
+
+
+def _select_grid_points(x, y, tolerance, initial_points):
+    """Select a subset of the reference points x so that linear interpolation of y through the subset is within
+    tolerance at all reference points. Each pass inserts the worst point of every interval that fails."""
+    keep = np.zeros(len(x), dtype=bool)
+    keep[np.linspace(0, len(x) - 1, min(initial_points, len(x))).astype(int)] = True
+
+    points = np.arange(len(x))
+    while True:
+        kept = np.flatnonzero(keep)
+        error = np.abs(y - np.interp(x, x[kept], y[kept]))
+        failed = error > tolerance
+        if not failed.any():
+            return x[keep]
+
+        # the point with the largest error in each interval between kept points
+        interval = np.searchsorted(kept, points, side="right") - 1
+        order = np.lexsort((-error, interval))
+        worst = order[np.r_[True, interval[order][1:] != interval[order][:-1]]]
+        keep[worst[failed[worst]]] = True
+
+
+def adaptive_energy_grid(energy_min, energy_max, isotopes=None, parfile=None, tolerance=1E-3, reference_points=100000, initial_points=200, temperature=None):
+    """Generate an energy grid that is dense around resonances and coarse elsewhere.
+
+    A reference grid is built from a fine logarithmic grid, the energies of the ZVView cross-section data of the
+    isotopes (which are themselves tabulated adaptively) and points around the resonances of a ParFile. If isotopes
+    are given, the sample transmission is computed on the reference grid and reduced to the points needed to
+    reproduce it by linear interpolation within tolerance. With only a ParFile, the transmission is modelled as
+    exp(-sum of unit-height Lorentzians) of its resonances and reduced the same way. Otherwise the reference grid
+    is returned.
+
+    Args:
+        energy_min (float): minimal energy in eV
+        energy_max (float): maximal energy in eV
+        isotopes (list, optional): list of Isotope objects with loaded cross-section data
+        parfile (ParFile, optional): ParFile instance whose resonances are used to seed the grid
+        tolerance (float, optional): maximal absolute transmission error of the grid. Defaults to 1E-3.
+        reference_points (int, optional): number of points of the logarithmic reference grid. Defaults to 100000.
+        initial_points (int, optional): number of points the reduction starts from. Defaults to 200.
+        temperature (float, optional): sample temperature in K used for Doppler broadening the transmission
+
+    Returns:
+        np.ndarray: sorted energy grid in eV
+    """
+    reference = [np.geomspace(energy_min, energy_max, reference_points)]
+    for isotope in isotopes or []:
+        xs_energies = np.asarray(isotope.xs_data, dtype=float)[:, 0]
+        reference.append(xs_energies[(xs_energies >= energy_min) & (xs_energies <= energy_max)])
+    if parfile is not None:
+        reference.append(resonance_energy_points(parfile, energy_min, energy_max))
+    reference = np.unique(np.concatenate(reference))
+
+    if isotopes:
+        _, transmission = calculate_transmission_matrix(reference, isotopes, temperature)
+    elif parfile is not None:
+        transmission = np.exp(-_resonance_profile(parfile, reference))
+    else:
+        return reference
+    return _select_grid_points(reference, transmission, tolerance, initial_points)
+
+
+def simulate_counts(energy_grid, transmission, open_beam, flight_path_length, realizations=1, chunk_size=1000, seed=None):
+    """Generate Poisson-sampled sample and open-beam count spectra from a simulated transmission.
+
+    The expected open-beam counts per bin are given by open_beam and the expected sample counts by
+    transmission * open_beam. Realizations are drawn in chunks, vectorized over the chunk, so that any number
+    of datasets can be produced without holding them all in memory.
+
+    Args:
+        energy_grid (array): energies in eV
+        transmission (array): transmission on the energy grid
+        open_beam (array): expected open-beam counts on the energy grid (flux shape times counting time)
+        flight_path_length (float): flight path length in m, used to compute the TOF grid
+        realizations (int, optional): total number of realizations. Defaults to 1.
+        chunk_size (int, optional): number of realizations per chunk. Defaults to 1000.
+        seed (int, optional): seed of the random number generator
+
+    Yields:
+        tuple: TOF grid (M,) in us, sample counts (k,M) and open-beam counts (k,M) of a chunk of k realizations
+    """
+    from pleiades.sammyUtils import energy2time
+
+    tof = energy2time(np.asarray(energy_grid, dtype=float), flight_path_length) * 1E6 # us
+    open_beam = np.broadcast_to(np.asarray(open_beam, dtype=float), tof.shape)
+    sample = open_beam * np.asarray(transmission, dtype=float)
+
+    rng = np.random.default_rng(seed)
+    for start in range(0, realizations, chunk_size):
+        size = (min(chunk_size, realizations - start), len(tof))
+        yield tof, rng.poisson(sample, size=size), rng.poisson(open_beam, size=size)
+
+
+def write_counts(output_prefix, energy_grid, transmission, open_beam, flight_path_length, realizations=1, chunk_size=1000, seed=None, dtype=np.int32):
+    """Stream Poisson-sampled count spectra (see simulate_counts) to disk chunk by chunk.
+
+    The realizations are written into memory-mapped .npy files '{output_prefix}.sample.npy' and
+    '{output_prefix}.openbeam.npy' of shape (realizations, M), and the TOF grid into '{output_prefix}.tof.npy'.
+
+    Args:
+        output_prefix (string): prefix of the output files
+        energy_grid (array): energies in eV
+        transmission (array): transmission on the energy grid
+        open_beam (array): expected open-beam counts on the energy grid
+        flight_path_length (float): flight path length in m
+        realizations (int, optional): total number of realizations. Defaults to 1.
+        chunk_size (int, optional): number of realizations held in memory at once. Defaults to 1000.
+        seed (int, optional): seed of the random number generator
+        dtype (dtype, optional): data type of the stored counts. Defaults to np.int32.
+
+    Returns:
+        tuple: paths of the TOF, sample counts and open-beam counts files
+    """
+    output_prefix = str(output_prefix)
+    os.makedirs(os.path.dirname(output_prefix) or ".", exist_ok=True)
+    files = tuple(pathlib.Path(f"{output_prefix}.{name}.npy") for name in ["tof", "sample", "openbeam"])
+
+    shape = (realizations, len(energy_grid))
+    sample_counts = np.lib.format.open_memmap(files[1], mode="w+", dtype=dtype, shape=shape)
+    open_beam_counts = np.lib.format.open_memmap(files[2], mode="w+", dtype=dtype, shape=shape)
+
+    start = 0
+    for tof, sample_chunk, open_beam_chunk in simulate_counts(energy_grid, transmission, open_beam, flight_path_length, realizations, chunk_size, seed):
+        stop = start + len(sample_chunk)
+        sample_counts[start:stop] = sample_chunk
+        open_beam_counts[start:stop] = open_beam_chunk
+        start = stop
+
+    sample_counts.flush()
+    open_beam_counts.flush()
+    del sample_counts, open_beam_counts
+    np.save(files[0], tof)
+
+    return files
+
+
+def create_transmission(energy_grid, isotope):
+    """Create the transmission data for the given material based on interpolation of the cross-section data and the energy grid for a given material thickness and density. This uses the the attenuation formula: T = e^(-sigma * A) where sigma is the cross-section, and A is the areal density, which is in units of atoms/barn.
+
+    This is the list-of-tuples version of calculate_transmission, kept for compatibility.
+
+    Args:
+        energy_grid (array): energies in eV
+        isotope (Isotope): Isotope object with loaded cross-section data
     
-    for energy in energy_grid:
-        # Get the cross-section at the given energy
-        xs = interpolate_xs_data(energy)
-        interploated_cross_section.append((energy, xs))
-        
-        # Calculate the transmission
-        transmission.append((energy, np.exp(-xs * areal_density)))    
+    Returns:
+        transmission (tuple array): list of tuples containing the energy and transmission data
+    """
+    return list(zip(energy_grid, calculate_transmission(energy_grid, isotope)))
 
-    return transmission
 
+def read_xs_file(file_location, isotope_name, use_cache=True, mmap_mode=None):
+    """ Read the cross-section data of an isotope from a ZVView file into an array.
 
-def parse_xs_file(file_location, isotope_name):
-    """ Parse the cross-section file and return the data for the isotope.
+    The "#data..." block of the isotope is parsed with a single bulk numeric load. The result is cached
+    in a .npy sidecar next to the file, which is used as long as the modification time and size of the file
+    match the ones recorded in the .json signature written with it.
 
     Args:
         file_location (string): File location of the cross-section data
         isotope_name (string): Name of the isotope to find in the file
+        use_cache (bool, optional): read and write the .npy sidecar cache. Defaults to True.
+        mmap_mode (string, optional): if set (e.g. 'r'), the sidecar is memory-mapped instead of read, so that
+            processes reading the same file share its pages. Defaults to None.
 
     Raises:
         ValueError: If the isotope is not found in the file
 
     Returns:
-        xs_data: List of tuples containing the energy and cross-section data
+        np.ndarray: (M,2) array of energies (eV) and cross-sections (barns)
     """
-    
-    xs_data = []
-    isotope_xs_found = False
-    capture_data = False
-    
-    
+    file_location = pathlib.Path(file_location)
+    cache_file = file_location.with_name(f"{file_location.name}.{isotope_name.upper()}.npy")
+    signature_file = cache_file.with_suffix(".json")
+    stat = file_location.stat()
+    signature = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+    if use_cache and cache_file.exists():
+        try:
+            with open(signature_file) as fid:
+                if json.load(fid) == signature:
+                    return np.load(cache_file, mmap_mode=mmap_mode)
+        except (OSError, ValueError):
+            # no or a corrupt signature, the sidecar is rebuilt
+            pass
+
     with open(file_location, 'r') as f:
-        for line in f:
-            # If we find the name of the isotope
-            if isotope_name.upper() in line:
-                isotope_xs_found = True
-            # If we have found the isotope, then look for the "#data..." marker
-            if isotope_xs_found:
-                if "#data..." in line:
-                    capture_data = True
-                # If we find the "//" line, stop capturing data
-                elif '//' in line:
-                    capture_data = False
-                    break
-                # If capture_data is True and the line doesn't start with a '#', then it's the data
-                elif capture_data and not line.startswith("#"):
-                    energy_eV, xs = line.split()
-                    xs_data.append((float(energy_eV)*1E6, float(xs))) # Convert energy from MeV to eV
-                
-                
-    # If the loop completes and the isotope was not found
-    if not isotope_xs_found:
+        text = f.read()
+
+    # If the isotope is not found in the file
+    isotope_position = text.find(isotope_name.upper())
+    if isotope_position < 0:
         raise ValueError("Cross-section data for {isotope_name} not found in {file_location}".format(isotope_name=isotope_name, file_location=file_location))
 
+    # The data block starts after the "#data..." marker and ends at the "//" line
+    data_start = text.find("#data...", text.rfind("\n", 0, isotope_position) + 1)
+    if data_start < 0:
+        xs_data = np.empty((0, 2))
+    else:
+        data_start = text.find("\n", data_start) + 1
+        data_end = text.find("//", data_start)
+        block = text[data_start:data_end if data_end >= 0 else len(text)]
+        xs_data = np.loadtxt(io.StringIO(block), comments="#", ndmin=2)
+        xs_data[:, 0] *= 1E6 # Convert energy from MeV to eV
+
+    # the signature is written after the array, so it never vouches for an older sidecar
+    if use_cache and pnd.write_atomic(cache_file, lambda fid: np.save(fid, xs_data)) \
+            and pnd.write_atomic(signature_file, lambda fid: json.dump(signature, fid), mode="w") \
+            and mmap_mode is not None:
+        return np.load(cache_file, mmap_mode=mmap_mode)
+
     return xs_data
 
 
+def parse_xs_file(file_location, isotope_name):
+    """ Parse the cross-section file and return the data for the isotope.
+
+    Args:
+        file_location (string): File location of the cross-section data
+        isotope_name (string): Name of the isotope to find in the file
+
+    Raises:
+        ValueError: If the isotope is not found in the file
+
+    Returns:
+        xs_data: List of tuples containing the energy and cross-section data
+    """
+    return [tuple(row) for row in read_xs_file(file_location, isotope_name).tolist()]
+
+
+
+class XSLibrary:
+    """Process-wide store of cross-section arrays shared between Isotope instances.
+
+    Arrays are keyed by (file, isotope name) and handed out read-only, so isotopes that reference the same
+    cross-section file share one copy. The least recently used arrays are dropped once the stored arrays
+    exceed the memory budget.
+    """
+    def __init__(self, memory_budget=512*1024**2, mmap_mode=None):
+        """
+        Args:
+            memory_budget (int, optional): maximal number of bytes held by the library. Defaults to 512 MB.
+            mmap_mode (string, optional): memory-map the .npy sidecars instead of reading them. Defaults to None.
+        """
+        self.memory_budget = memory_budget
+        self.mmap_mode = mmap_mode
+        self._store = OrderedDict()   # key -> (source mtime, array)
+        self._lock = threading.Lock()
+
+    @property
+    def nbytes(self):
+        """int: number of bytes held by the library"""
+        return sum(xs_data.nbytes for _, xs_data in self._store.values())
+
+    def __len__(self):
+        return len(self._store)
+
+    def get(self, file_location, isotope_name):
+        """Return the cross-section data of an isotope, reading the file only if it is not stored yet.
+
+        Args:
+            file_location (string): File location of the cross-section data
+            isotope_name (string): Name of the isotope to find in the file
+
+        Returns:
+            np.ndarray: read-only (M,2) array of energies (eV) and cross-sections (barns)
+        """
+        file_location = pathlib.Path(file_location).resolve()
+        key = (str(file_location), isotope_name.upper())
+        mtime = file_location.stat().st_mtime_ns
+
+        with self._lock:
+            if key in self._store and self._store[key][0] == mtime:
+                self._store.move_to_end(key)
+                return self._store[key][1]
+
+        xs_data = read_xs_file(file_location, isotope_name, mmap_mode=self.mmap_mode)
+        xs_data.setflags(write=False)
+
+        with self._lock:
+            self._store[key] = (mtime, xs_data)
+            self._store.move_to_end(key)
+            # evict the least recently used arrays, but always keep the one just requested
+            while len(self._store) > 1 and self.nbytes > self.memory_budget:
+                self._store.popitem(last=False)
+
+        return xs_data
+
+    def clear(self):
+        """Drop all stored arrays."""
+        with self._lock:
+            self._store.clear()
+
+
+# cross-section store shared by all Isotope instances of the process
+XS_LIBRARY = XSLibrary()
+
 
 class Isotope:
     """Class to hold information about an isotope from a config file.
     """
-    def __init__(self, name="Unknown", atomic_mass=0.0, thickness=0.0, thickness_unit="atoms/cm2", abundance=0.0, xs_file_location="Unknown", density=0.0, density_unit="g/cm3"):
+    def __init__(self, name="Unknown", atomic_mass=0.0, thickness=0.0, thickness_unit="atoms/cm2", abundance=1.0, xs_file_location="Unknown", density=0.0, density_unit="g/cm3"):
         self.name = name
         self.atomic_mass = atomic_mass
         self.thickness = thickness
@@ -117,12 +706,12 @@ class Isotope:
         self.xs_file_location = xs_file_location
         self.density = density
         self.density_unit = density_unit
-        self.xs_data = []  # Array to hold xs data
+        self.xs_data = []  # Array to hold xs data, shared read-only with other isotopes through XS_LIBRARY
     
     def load_xs_data(self):
         """Load cross-section data from file."""
-        self.xs_data = parse_xs_file(self.xs_file_location, self.name)
-        if not self.xs_data:
+        self.xs_data = XS_LIBRARY.get(self.xs_file_location, self.name)
+        if len(self.xs_data) == 0:
             raise ValueError(f"No data loaded for {self.name} from {self.xs_file_location}")
     
     def __repr__(self):
@@ -176,27 +765,106 @@ def load_isotopes_from_config(config_file, verbose=False):
 
     return isotopes
 
+
+
+def _xs_sources(job):
+    """Return the (xs file, isotope name) pairs referenced by a config file or a list of Isotope objects."""
+    if isinstance(job, (str, os.PathLike)):
+        config = configparser.ConfigParser()
+        config.read(job)
+        return [(config.get(section, 'xs_file_location', fallback=Isotope().xs_file_location), config.get(section, 'name', fallback=Isotope().name))
+                for section in config.sections() if not config.getboolean(section, 'ignore', fallback=False)]
+    return [(isotope.xs_file_location, isotope.name) for isotope in job]
+
+
+def _init_simulation_worker():
+    """Make the cross-section store of a worker process memory-map the shared .npy sidecars."""
+    XS_LIBRARY.mmap_mode = "r"
+
+
+def _simulate_job(job, energy_grid, temperature):
+    """Simulate the combined transmission of one config file or list of Isotope objects in a worker process."""
+    if isinstance(job, (str, os.PathLike)):
+        isotopes = load_isotopes_from_config(job)
+    else:
+        isotopes = job
+        for isotope in isotopes:
+            isotope.load_xs_data()
+    return calculate_transmission_matrix(energy_grid, isotopes, temperature)[1]
+
+
+def simulate_configs(jobs, energy_grid, temperature=None, max_workers=None, output_file=None, verbose=False):
+    """Simulate the combined transmission of many samples in parallel over a process pool.
+
+    Each job is either the path of an isotope config file (see load_isotopes_from_config) or a list of
+    Isotope objects. The .npy sidecars of all referenced cross-section files are created once up front, and the
+    workers memory-map them, so every cross-section array is held in memory only once. Isotope objects are sent
+    to the workers without their cross-section data.
+
+    Args:
+        jobs (list): config file paths or lists of Isotope objects
+        energy_grid (array): energies in eV
+        temperature (float, optional): sample temperature in K, if given the cross-sections are Doppler broadened
+        max_workers (int, optional): number of worker processes. Defaults to the number of CPUs.
+        output_file (string, optional): if given, the results are gathered into this .npy file
+        verbose (bool, optional): Print verbose output. Defaults to False.
+
+    Returns:
+        np.ndarray: (len(jobs),M) combined transmissions, memory-mapped from output_file if given
+    """
+    import copy
+    from concurrent.futures import ProcessPoolExecutor
+
+    energy_grid = np.asarray(energy_grid, dtype=float)
+
+    # strip the cross-section data, it is reloaded from the shared sidecars by the workers
+    jobs = [job if isinstance(job, (str, os.PathLike)) else [copy.copy(isotope) for isotope in job] for job in jobs]
+    for job in jobs:
+        if not isinstance(job, (str, os.PathLike)):
+            for isotope in job:
+                isotope.xs_data = []
+
+    for xs_file_location, name in set(source for job in jobs for source in _xs_sources(job)):
+        read_xs_file(xs_file_location, name, mmap_mode="r")
+
+    shape = (len(jobs), len(energy_grid))
+    if output_file is not None:
+        transmissions = np.lib.format.open_memmap(output_file, mode="w+", dtype=float, shape=shape)
+    else:
+        transmissions = np.empty(shape)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_simulation_worker) as executor:
+        futures = [executor.submit(_simulate_job, job, energy_grid, temperature) for job in jobs]
+        for row, future in enumerate(futures):
+            transmissions[row] = future.result()
+            if verbose:
+                print(f"Simulated {row+1}/{len(jobs)} samples")
+
+    if output_file is not None:
+        transmissions.flush()
+    return transmissions
+
   
-def write_transmission_data(energy_data, transmission_data, output_file, include_error=False, verbose=False):
+def write_transmission_data(energy_data, transmission_data, output_file, include_error=False, verbose=False, error_data=None, archivename=None, binary=False):
     """Write the transmission data to a file in the format: energy (eV), transmission (0-1) with SAMMY's twenty character format.
 
     Args:
-        transmission_data (array): List of tuples containing the energy and transmission data
+        energy_data (array): energies in eV
+        transmission_data (array): transmission values
         output_file (string): Path to the output file
         include_error (bool, optional): Include an error column. Defaults to False.
         verbose (bool, optional): Print verbose output. Defaults to False.
+        error_data (array, optional): transmission errors, a constant error of 0.1 is written if not given
+        archivename (string, optional): write the file straight into the run directory archive/{archivename}
+        binary (bool, optional): write a binary spectrum (see sammyData.save_spectrum) instead. Defaults to False.
     """
-    with open(output_file, 'w') as f:
-        if verbose:
-            print(f"Writing transmission data to {output_file}")
-            
-        for energy, transmission in zip(energy_data,transmission_data):
-            energy_str = f"{energy:>20}"                    # Right-justified, 20 characters
-            transmission_str = f"{transmission:>20}"        # Right-justified, 20 characters
-            transmission_error_str = f"{0.1:>20}"           # Right-justified, 20 characters
-            
-            if include_error:
-                f.write(f"{energy_str}{transmission_str}{transmission_error_str}\n")
-            else:
-                f.write(f"{energy_str}{transmission_str}\n")    # Write the data to the file
+    if verbose:
+        print(f"Writing transmission data to {output_file}")
 
+    if include_error and error_data is None:
+        error_data = 0.1
+    if binary:
+        sammyData.save_spectrum(output_file, energy_data, transmission_data, error_data if include_error else None,
+                                metadata={"source": "simData"}, archivename=archivename)
+    else:
+        sammyData.write_twenty(output_file, energy_data, transmission_data, error_data if include_error else None, archivename=archivename)
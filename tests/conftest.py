@@ -0,0 +1,85 @@
+import os
+import sys
+import pytest
+
+FAKE_SAMMY = f"""#!{sys.executable}
+# stand-in for the sammy executable: reads the file names from stdin and writes the usual output files
+import os, sys, time
+start = time.time()
+time.sleep(float(os.environ.get("FAKE_SAMMY_DELAY", 0)))
+inpfile, parfile, datafile = [sys.stdin.readline().strip() for _ in range(3)]
+for name in [inpfile, datafile]:
+    assert os.path.exists(name), name
+print("fake sammy", inpfile, parfile, datafile)
+with open(os.environ.get("FAKE_SAMMY_LOG", os.devnull), "a") as log:
+    log.write(f"{{inpfile}} {{start}} {{time.time()}}\\n")
+if parfile.endswith(".endf"):
+    outputs = ["SAMNDF.PAR", "SAMNDF.INP", "SAMMY.LPT"]
+else:
+    outputs = ["SAMMY.LST", "SAMMY.LPT", "SAMMY.IO", "SAMMY.PAR", "SAMQUA.PAR"]
+for name in outputs:
+    with open(name, "w") as fid:
+        fid.write(os.getcwd())
+"""
+
+@pytest.fixture
+def fake_sammy(tmp_path, monkeypatch):
+    bin_path = tmp_path / "bin"
+    bin_path.mkdir()
+    sammy = bin_path / "sammy"
+    sammy.write_text(FAKE_SAMMY)
+    sammy.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+    work_path = tmp_path / "work"
+    work_path.mkdir()
+    monkeypatch.chdir(work_path)
+    return work_path
+
+def endf_line(content, mat, mf, mt, ns=0):
+    return f"{content:66s}{mat:4d}{mf:2d}{mt:3d}{ns:5d}\n"
+
+@pytest.fixture
+def endf_tape(tmp_path):
+    """a small ENDF tape holding the materials 7925, 6325 and 9237"""
+    lines = [endf_line(" test library", 1, 0, 0)]
+    for mat in [7925, 6325, 9237]:
+        lines += [endf_line(f" {mat} file 1", mat, 1, 451, 1), endf_line("", mat, 1, 0, 99999), endf_line("", mat, 0, 0),
+                  endf_line(f" {mat} resonances", mat, 2, 151, 1), endf_line("", mat, 2, 0, 99999), endf_line("", mat, 0, 0),
+                  endf_line("", 0, 0, 0)]
+    lines.append(endf_line("", -1, 0, 0))
+    tape = tmp_path / "library.endf"
+    tape.write_text("".join(lines))
+    return tape
+
+def endf_number(value):
+    """an ENDF float field, e.g. 1.815000+0"""
+    mantissa, exponent = f"{value:.6e}".split("e")
+    return f"{mantissa}{int(exponent):+d}".rjust(11)
+
+@pytest.fixture
+def endf_resonance_tape(tmp_path):
+    """an ENDF tape with Reich-Moore resonances of Eu-151 (MAT 6325) taken from tests/files/Eu_151.par"""
+    mat = 6325
+    resonances = [[1.815, 2., 4.08e-5, 9.10000100e-2, 0., 0.],
+                  [-6.09e-2, 3., 7.6778e-5, 0.1052, 0., 0.],
+                  [3.368, 2., 2.196e-3, 9.3e-2, 0., 0.],
+                  [0.321, 3., 7.140001e-5, 7.95e-2, 0., 0.]]
+    awr = 150.916445 / 1.00866491578
+
+    def record(*fields):
+        return "".join(endf_number(field) if isinstance(field, float) else f"{field:11d}" for field in fields)
+
+    section = [record(63151., awr, 0, 0, 1, 0),
+               record(63151., 1., 0, 0, 1, 0),
+               record(1e-5, 100., 1, 3, 0, 0),
+               record(2.5, 0.79, 0, 0, 1, 0),
+               record(awr, 0., 0, 0, 6*len(resonances), len(resonances))]
+    section += [record(*values) for values in resonances]
+
+    lines = [endf_line(" test library", 1, 0, 0), endf_line(" 6325 file 1", mat, 1, 451, 1), endf_line("", mat, 1, 0, 99999),
+             endf_line("", mat, 0, 0)]
+    lines += [endf_line(content, mat, 2, 151, ns) for ns, content in enumerate(section, start=1)]
+    lines += [endf_line("", mat, 2, 0, 99999), endf_line("", mat, 0, 0), endf_line("", 0, 0, 0), endf_line("", -1, 0, 0)]
+    tape = tmp_path / "resonances.endf"
+    tape.write_text("".join(lines))
+    return tape
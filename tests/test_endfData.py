@@ -0,0 +1,60 @@
+from pleiades import endfData
+import pytest
+
+from conftest import endf_line
+
+
+def test_mat_index(endf_tape):
+    index = endfData.get_mat_index(endf_tape)
+    assert sorted(mat for mat in index if mat != "header") == [6325, 7925, 9237]
+    assert index["header"].startswith(" test library")
+    # the index is cached next to the library
+    assert endf_tape.with_name("library.endf.matindex").exists()
+
+    section = endfData.read_mat(6325, endf_tape).decode().splitlines(keepends=True)
+    assert section[0] == endf_line(" 6325 file 1", 6325, 1, 451, 1)
+    assert section[-1] == endf_line("", 0, 0, 0)
+    assert all(line[66:70] == "6325" for line in section[:-1])
+
+    with pytest.raises(KeyError):
+        endfData.read_mat(1234, endf_tape)
+
+def test_mat_index_rebuilt(endf_tape):
+    endfData.get_mat_index(endf_tape)
+    endf_tape.write_text(endf_tape.read_text().replace(" 9237", " 9235"))
+    assert 9235 in endfData.get_mat_index(endf_tape)
+    assert 9237 not in endfData.get_mat_index(endf_tape)
+
+def test_extract_mat(endf_tape, tmp_path):
+    # writing over a link to the library must not modify the library
+    output_file = tmp_path / "u238.endf"
+    output_file.symlink_to(endf_tape)
+    library = endf_tape.read_text()
+
+    endfData.extract_mat(9237, output_file, endf_tape)
+    assert not output_file.is_symlink()
+    assert endf_tape.read_text() == library
+
+    lines = output_file.read_text().splitlines(keepends=True)
+    assert lines[0] == endf_line(" test library", 1, 0, 0)
+    assert lines[1] == endf_line(" 9237 file 1", 9237, 1, 451, 1)
+    assert lines[-2:] == [endf_line("", 0, 0, 0), endf_line("", -1, 0, 0)]
+    assert len(lines) == 9
+
+def test_read_resonances(endf_resonance_tape):
+    resonances = endfData.read_resonances(6325, endf_resonance_tape)
+    assert resonances["ZA"] == 63151
+    resolved_range, = resonances["isotopes"][0]["ranges"]
+    assert resolved_range["formalism"] == "Reich-Moore"
+    assert resolved_range["SPI"] == 2.5
+    assert resolved_range["AP"] == pytest.approx(7.9)
+    l_value, = resolved_range["l_values"]
+    assert l_value["L"] == 0
+    assert l_value["resonances"].shape == (4, 6)
+    assert l_value["resonances"][1, :2].tolist() == [-6.09e-2, 3.]
+
+    # a material without resonance parameters
+    lines = endf_resonance_tape.read_text().splitlines(keepends=True)
+    endf_resonance_tape.write_text("".join(line for line in lines if line[70:72] != " 2"))
+    with pytest.raises(ValueError):
+        endfData.read_resonances(6325, endf_resonance_tape)
@@ -1,5 +1,6 @@
 from pleiades import nucData
 from numpy import testing
+import numpy as np
 import pytest
 
 
@@ -53,3 +54,78 @@ def test_get_mat_number():
         nucData.get_mat_number("We-200")
 
 
+
+def test_isotope_database():
+    db = nucData.get_database()
+    assert db is nucData.get_database() # tables are parsed once and shared
+
+    testing.assert_equal(db.mass("Eu-151"), nucData.get_mass_from_ame("Eu-151"))
+    testing.assert_equal(db.mass("Eu151"), db.mass("Eu_151"))
+    testing.assert_equal(db.mat_number("U-238"), 9237)
+    testing.assert_equal(db.spin("Eu-151"), 2.5)
+    testing.assert_equal(db.abundance("Eu-153"), 52.19)
+    testing.assert_equal(db.by_ZA(92, 238), "U-238")
+    assert db.mass("input_file") is None
+
+    spin, abundance = nucData.extract_isotope_info(nucData.ISOTOPES_INFO_FILE, "U-235")
+    testing.assert_equal((spin, abundance), ("3.5", "0.7200"))
+
+
+def test_isotope_database_cache(tmp_path):
+    import shutil
+    neutrons_file = shutil.copy(nucData.NEUTRONS_LIST_FILE, tmp_path / "neutrons.list")
+    cache_file = tmp_path / "isotopeInfo.cache"
+
+    db = nucData.IsotopeDatabase(neutrons_file=neutrons_file, cache_file=cache_file)
+    testing.assert_equal(db.mat_number("U-238"), 9237)
+    assert cache_file.exists()
+
+    # a fresh instance reads the tables back from the cache without parsing the text file
+    db = nucData.IsotopeDatabase(neutrons_file=neutrons_file, cache_file=cache_file)
+    db._read_neutrons_list = None
+    testing.assert_equal(db.mat_number("U-238"), 9237)
+
+    # a modified source file invalidates the cached table
+    with open(neutrons_file, "a") as fid:
+        fid.write(" 558) 100-Fm-256 JAEA+      EVAL-JAN10 O.Iwamoto, T.Nakagawa, et al.    9937\n")
+    db = nucData.IsotopeDatabase(neutrons_file=neutrons_file, cache_file=cache_file)
+    testing.assert_equal(db.mat_number("Fm-256"), 9937)
+
+
+def test_read_ame_table():
+    table = nucData.read_ame_table()
+    u238 = table[(table["el"] == "U") & (table["A"] == 238)][0]
+    testing.assert_equal(u238["Z"], 92)
+    testing.assert_equal(round(u238["atomic_mass"]/1E6, 4), 238.0508)
+
+    # '#' marks an estimated value, '*' a value that can not be calculated
+    li3 = table[(table["el"] == "Li") & (table["A"] == 3)][0]
+    testing.assert_equal(li3["mass"], 28667.)
+    assert np.isnan(li3["beta"])
+
+
+def test_get_masses():
+    masses = nucData.get_masses(["U-235", "U-238", "Eu151", "We-200"])
+    testing.assert_array_equal(masses[:3], [nucData.get_mass_from_ame(iso) for iso in ["U-235", "U-238", "Eu151"]])
+    assert np.isnan(masses[3])
+
+
+def test_expand_element():
+    isotopes = nucData.expand_element("Eu")
+    testing.assert_equal([iso["name"] for iso in isotopes], ["Eu-151", "Eu-153"])
+    testing.assert_equal([iso["mat"] for iso in isotopes], [6325, 6331])
+    testing.assert_equal(isotopes[0]["mass"], nucData.get_mass_from_ame("Eu-151"))
+    testing.assert_equal(isotopes[0]["spin"], 2.5)
+
+    abundances = nucData.get_natural_abundances("W")
+    testing.assert_almost_equal(sum(abundances.values()), 1.0, decimal=3)
+
+    with pytest.raises(ValueError):
+        nucData.expand_element("Xx")
+
+def test_write_atomic(tmp_path):
+    assert nucData.write_atomic(tmp_path / "table.txt", lambda fid: fid.write("table\n"), mode="w")
+    assert (tmp_path / "table.txt").read_text() == "table\n"
+    # an unwritable location is reported, and leaves no temporary files behind
+    assert not nucData.write_atomic(tmp_path / "missing/table.txt", lambda fid: fid.write(b"table\n"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["table.txt"]
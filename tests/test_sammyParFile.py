@@ -139,3 +139,35 @@ def test_read_write_compound_file():
     
 
 
+
+def test_read_endf(endf_resonance_tape, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # the spin groups and radii of the ENDF resonances are the same as the ones SAMMY writes
+    par = sammyParFile.ParFile("Eu_151.par", name="none").read_endf(endf_file=endf_resonance_tape)
+    reference = sammyParFile.ParFile(PWD / "Eu_151.par", name="none").read()
+
+    assert len(par.data["spin_group"]) == len(reference.data["spin_group"])
+    for (group, channel), (reference_group, reference_channel) in zip(par.data["spin_group"], reference.data["spin_group"]):
+        assert group == reference_group
+        # the true radius depends on the mass constants SAMMY uses
+        assert float(channel["true_radius"]) == pytest.approx(float(reference_channel["true_radius"]), abs=1e-6)
+        assert {**channel, "true_radius": None} == {**reference_channel, "true_radius": None}
+    assert par.data["channel_radii"] == reference.data["channel_radii"]
+    assert par.data["particle_pairs"][0]["spin_b"] == reference.data["particle_pairs"][0]["spin_b"]
+    assert float(par.data["particle_pairs"][0]["mass_b"]) == pytest.approx(150.916445, rel=1e-6)
+
+    energies = [float(res["reosnance_energy"]) for res in par.data["resonance_params"]]
+    assert energies == [1.815, 3.368, -6.09e-2, 0.321]
+    assert [res["igroup"] for res in par.data["resonance_params"]] == [" 1", " 1", " 2", " 2"]
+    assert float(par.data["resonance_params"][0]["capture_width"]) == pytest.approx(91.00001)
+    assert float(par.data["resonance_params"][0]["neutron_width"]) == pytest.approx(4.08e-2)
+
+    # the parameters are written as a regular par file
+    par.update.normalization()
+    par.update.broadening()
+    par.update.resolution()
+    par.update.misc()
+    par.write("Eu_151_endf.par")
+    loopback = sammyParFile.ParFile("Eu_151_endf.par", name="none").read()
+    assert [res["igroup"] for res in loopback.data["resonance_params"]] == [" 1", " 1", " 2", " 2"]
+    assert loopback.data["channel_radii"] == reference.data["channel_radii"]
@@ -0,0 +1,297 @@
+from pleiades import sammyRunner
+import os
+import concurrent.futures
+import pathlib
+import subprocess
+import sys
+import time
+import pytest
+
+def write_inputs(name):
+    for suffix in ["inp", "par", "dat"]:
+        pathlib.Path(f"{name}.{suffix}").write_text(f"{name}\n")
+
+def test_run(fake_sammy):
+    write_inputs("gold")
+    completed = sammyRunner.run("gold")
+
+    assert completed.returncode == 0
+    assert "fake sammy gold.inp gold.par gold.dat" in completed.stdout
+    assert pathlib.Path.cwd() == fake_sammy
+
+    archive_path = fake_sammy / "archive/gold"
+    assert (archive_path / "gold.out").read_text() == completed.stdout
+    for suffix in ["lst", "lpt", "io", "par"]:
+        assert (archive_path / f"results/gold.{suffix}").read_text() == str(archive_path)
+    assert not list(archive_path.glob("SAM*"))
+
+def test_run_concurrent(fake_sammy, monkeypatch):
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "0.2")
+    names = [f"sample{index}" for index in range(4)]
+    for name in names:
+        write_inputs(name)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(sammyRunner.run, names))
+
+    assert all(completed.returncode == 0 for completed in results)
+    # each run wrote its results inside its own archive directory
+    for name in names:
+        assert (fake_sammy / f"archive/{name}/results/{name}.lpt").read_text() == str(fake_sammy / f"archive/{name}")
+
+def test_exit_code():
+    def exit_code(script):
+        process = subprocess.Popen([sys.executable, "-c", script])
+        process.returncode = sammyRunner._exit_code(os.wait4(process.pid, 0)[1])
+        return process.returncode
+
+    assert exit_code("raise SystemExit(0)") == 0
+    assert exit_code("raise SystemExit(3)") == 3
+    assert exit_code("import os, signal; os.kill(os.getpid(), signal.SIGKILL)") == -9
+
+def test_run_timeout(fake_sammy, monkeypatch):
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "5")
+    write_inputs("slow")
+    with pytest.raises(subprocess.TimeoutExpired):
+        sammyRunner.run("slow", timeout=0.5)
+    assert pathlib.Path.cwd() == fake_sammy
+
+def test_run_endf(fake_sammy):
+    pathlib.Path("Au_197.inp").write_text("title\nAu-197 196.9666 1.0 100.0\n")
+    completed = sammyRunner.run_endf("Au_197.inp")
+
+    assert completed.returncode == 0
+    archive_path = fake_sammy / "archive/Au_197"
+    assert (archive_path / "Au_197.dat").read_text() == "100.0 0 0\n1.0 0 0\n"
+    for suffix in ["par", "inp", "lpt"]:
+        assert (archive_path / f"results/Au_197.{suffix}").exists()
+
+def peak_concurrency(log):
+    """largest number of fake sammy runs in the log that were running at the same time"""
+    events = []
+    for line in log.read_text().splitlines():
+        _, start, end = line.split()
+        events += [(float(start), 1), (float(end), -1)]
+    running = peak = 0
+    # runs ending at the start of another one do not overlap it
+    for _, change in sorted(events):
+        running += change
+        peak = max(peak, running)
+    return peak
+
+def test_run_batch(fake_sammy, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "0.3")
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("FAKE_SAMMY_LOG", str(log))
+    names = [f"pixel{index}" for index in range(6)]
+    for name in names[:5]:
+        write_inputs(name)
+    jobs = names[:4] + [("pixel4", "pixel4.inp", "pixel4.par", "pixel4.dat"), {"archivename": "pixel5"}]
+
+    results = sammyRunner.run_batch(jobs, max_workers=6, retries=1)
+    # the runs overlap instead of running one after the other
+    assert peak_concurrency(log) > 1
+
+    assert sorted(results) == names
+    for name in names[:5]:
+        assert results[name]["returncode"] == 0 and results[name]["error"] is None
+        assert results[name]["attempts"] == 1 and results[name]["elapsed"] >= 0.3
+    # pixel5 has no input files, the fake sammy fails and the job is retried once
+    assert results["pixel5"]["returncode"] != 0
+    assert results["pixel5"]["attempts"] == 2
+    assert "AssertionError" in results["pixel5"]["error"]
+
+def test_run_async(fake_sammy, tmp_path, monkeypatch):
+    import asyncio
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "0.3")
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("FAKE_SAMMY_LOG", str(log))
+    names = [f"window{index}" for index in range(4)]
+    for name in names:
+        write_inputs(name)
+
+    async def main():
+        semaphore = asyncio.Semaphore(2)
+        return await asyncio.gather(*[sammyRunner.run_async(name, semaphore=semaphore) for name in names])
+
+    results = asyncio.run(main())
+
+    assert all(completed.returncode == 0 for completed in results)
+    # the semaphore lets two runs overlap, never more
+    assert peak_concurrency(log) == 2
+    for name in names:
+        assert (fake_sammy / f"archive/{name}/results/{name}.lpt").exists()
+
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "5")
+    with pytest.raises(subprocess.TimeoutExpired):
+        asyncio.run(sammyRunner.run_async("window0", timeout=0.3))
+
+def test_result_cache(fake_sammy, tmp_path, monkeypatch):
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("FAKE_SAMMY_LOG", str(log))
+    cache = sammyRunner.ResultCache(tmp_path / "cache", max_bytes=10**6)
+    write_inputs("gold")
+    first = sammyRunner.run("gold", cache=cache)
+    assert len(cache.entries()) == 1
+
+    # a hit restores the results without running sammy
+    (fake_sammy / "archive/gold/results/gold.lpt").unlink()
+    second = sammyRunner.run("gold", cache=cache)
+    assert second.returncode == 0 and second.stdout == first.stdout
+    assert (fake_sammy / "archive/gold/results/gold.lpt").exists()
+    assert log.read_text().count("gold.inp") == 1
+
+    # different inputs are a miss
+    pathlib.Path("gold.par").write_text("changed\n")
+    sammyRunner.run("gold", cache=cache)
+    assert log.read_text().count("gold.inp") == 2
+    assert len(cache.entries()) == 2
+
+    # identical inputs under another archive name are a hit
+    for suffix in ["inp", "par", "dat"]:
+        pathlib.Path(f"silver.{suffix}").write_bytes(pathlib.Path(f"gold.{suffix}").read_bytes())
+    sammyRunner.run("silver", cache=cache)
+    assert "silver.inp" not in log.read_text()
+    assert (fake_sammy / "archive/silver/results/silver.lpt").exists()
+
+def test_result_cache_files(tmp_path):
+    cache = sammyRunner.ResultCache(tmp_path / "cache")
+    (tmp_path / "result.par").write_text("par\n")
+    # missing files are skipped
+    cache.store_files("ab12", {"par": tmp_path / "result.par", "lpt": tmp_path / "missing.lpt"})
+    assert sorted(path.name for path in (tmp_path / "cache/ab12").iterdir()) == ["par"]
+
+    assert cache.restore_files("ab12", {"par": tmp_path / "restored.par", "lpt": tmp_path / "restored.lpt"})
+    assert (tmp_path / "restored.par").read_text() == "par\n"
+    assert not (tmp_path / "restored.lpt").exists()
+    assert not cache.restore_files("cd34", {"par": tmp_path / "other.par"})
+
+def test_result_cache_eviction(fake_sammy, tmp_path):
+    cache = sammyRunner.ResultCache(tmp_path / "cache")
+    for name in ["first", "second", "third"]:
+        write_inputs(name)
+        sammyRunner.run(name, cache=cache)
+        time.sleep(0.01)
+    entries = cache.entries()
+    assert len(entries) == 3
+
+    # keep room for the two most recently used entries
+    cache.max_bytes = entries[1][1] + entries[2][1]
+    cache.evict()
+    assert [entry for _, _, entry in cache.entries()] == [entry for _, _, entry in entries[1:]]
+
+def test_run_stats(fake_sammy, monkeypatch):
+    import json
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "0.2")
+    write_inputs("gold")
+    sammyRunner.run("gold")
+
+    stats = json.loads((fake_sammy / "archive/gold/results/gold.run.json").read_text())
+    assert stats["returncode"] == 0 and not stats["cached"]
+    assert stats["sammy"]["wall_time"] >= 0.2
+    assert stats["sammy"]["cpu_time"] > 0 and stats["sammy"]["max_rss_bytes"] > 0
+    assert set(stats["timings"]) == {"stage", "sammy", "collect", "total"}
+    assert stats["timings"]["total"] >= stats["timings"]["sammy"]
+    assert stats["bytes_staged"] == 3*len("gold\n")
+    assert stats["bytes_produced"] > 0
+
+def test_run_endf_extracts_mat(fake_sammy, endf_tape, monkeypatch):
+    from pleiades import endfData
+    monkeypatch.setattr(endfData, "ENDF_FILE", endf_tape)
+    pathlib.Path("Au_197.inp").write_text("title\nAu-197 196.9666 1.0 100.0\nINPUT IS ENDF/B FILE MAT=7925\n")
+    completed = sammyRunner.run_endf("Au_197.inp")
+
+    assert "Au_197.endf" in completed.stdout
+    endf_file = fake_sammy / "archive/Au_197/Au_197.endf"
+    assert not endf_file.is_symlink()
+    assert {line[66:70] for line in endf_file.read_text().splitlines()} == {"   1", "7925", "   0", "  -1"}
+
+    # the staged tape counts towards the staged bytes of the run
+    import json
+    stats = json.loads((fake_sammy / "archive/Au_197/results/Au_197.run.json").read_text())
+    staged = ["Au_197.inp", "Au_197.endf", "Au_197.dat"]
+    assert stats["bytes_staged"] == sum((fake_sammy / "archive/Au_197" / name).stat().st_size for name in staged)
+
+def test_stage_file(tmp_path):
+    source = tmp_path / "sample.dat"
+    source.write_text("data\n")
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+
+    assert sammyRunner.stage_file(source, run_dir / "copy.dat", "copy") == "copy"
+    assert not (run_dir / "copy.dat").samefile(source)
+
+    assert sammyRunner.stage_file(source, run_dir / "link.dat", "hardlink") == "hardlink"
+    assert (run_dir / "link.dat").samefile(source)
+
+    # reflinks fall back to a copy on filesystems without copy-on-write support
+    assert sammyRunner.stage_file(source, run_dir / "clone.dat", "reflink") in ["reflink", "copy"]
+    assert (run_dir / "clone.dat").read_text() == "data\n"
+
+    # restaging replaces the link instead of writing through it into the source
+    (run_dir / "link.dat").unlink()
+    os.link(source, run_dir / "link.dat")
+    other = tmp_path / "other.dat"
+    other.write_text("other\n")
+    sammyRunner.stage_file(other, run_dir / "link.dat", "copy")
+    assert source.read_text() == "data\n"
+    assert (run_dir / "link.dat").read_text() == "other\n"
+
+    # files generated inside the run directory are used in place
+    assert sammyRunner.stage_file(run_dir / "copy.dat", run_dir / "copy.dat") == "none"
+    assert (run_dir / "copy.dat").read_text() == "data\n"
+
+    with pytest.raises(FileNotFoundError):
+        sammyRunner.stage_file(tmp_path / "missing.dat", run_dir / "copy.dat")
+    assert (run_dir / "copy.dat").exists()
+    with pytest.raises(ValueError):
+        sammyRunner.stage_file(source, run_dir / "copy.dat", "symlink")
+
+def test_run_hardlink_staging(fake_sammy):
+    write_inputs("linked")
+    sammyRunner.run("linked", staging="hardlink")
+
+    archive_path = fake_sammy / "archive/linked"
+    for suffix in ["inp", "par", "dat"]:
+        assert (archive_path / f"linked.{suffix}").samefile(f"linked.{suffix}")
+    assert (archive_path / "results/linked.lpt").exists()
+
+    # inputs already inside the archive are not staged again
+    completed = sammyRunner.run("linked", inpfile=archive_path / "linked.inp", parfile=archive_path / "linked.par",
+                                datafile=archive_path / "linked.dat", staging="copy")
+    assert completed.returncode == 0
+    assert (archive_path / "linked.inp").samefile("linked.inp")
+
+def test_run_scratch(fake_sammy, tmp_path):
+    import asyncio
+
+    scratch = tmp_path / "shm"
+    write_inputs("scratch")
+    completed = sammyRunner.run("scratch", scratch=scratch)
+
+    assert completed.returncode == 0
+    archive_path = fake_sammy / "archive/scratch"
+    assert (archive_path / "scratch.out").read_text() == completed.stdout
+    for suffix in ["lst", "lpt", "io", "par"]:
+        # sammy ran in a directory inside the scratch directory
+        assert pathlib.Path((archive_path / f"results/scratch.{suffix}").read_text()).parent == scratch
+    assert not list(archive_path.glob("SAM*"))
+    # the scratch run directory is removed
+    assert list(scratch.iterdir()) == []
+
+    pathlib.Path("Au_197.inp").write_text("title\nAu-197 196.9666 1.0 100.0\n")
+    assert sammyRunner.run_endf("Au_197.inp", scratch=scratch).returncode == 0
+    assert (fake_sammy / "archive/Au_197/results/Au_197.par").exists()
+    assert list(scratch.iterdir()) == []
+
+    write_inputs("scratch_async")
+    assert asyncio.run(sammyRunner.run_async("scratch_async", scratch=scratch)).returncode == 0
+    assert (fake_sammy / "archive/scratch_async/results/scratch_async.lpt").exists()
+    assert list(scratch.iterdir()) == []
+
+def test_run_scratch_timeout(fake_sammy, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_SAMMY_DELAY", "5")
+    write_inputs("slow")
+    with pytest.raises(subprocess.TimeoutExpired):
+        sammyRunner.run("slow", timeout=0.5, scratch=tmp_path / "shm")
+    assert list((tmp_path / "shm").iterdir()) == []
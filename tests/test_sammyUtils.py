@@ -0,0 +1,51 @@
+from pleiades import sammyUtils, sammyRunner
+import pathlib
+
+
+def test_par_from_endf(fake_sammy, tmp_path, monkeypatch):
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("FAKE_SAMMY_LOG", str(log))
+
+    isotopes = ["Eu-151", "Eu-153", "U-238"]
+    pars = sammyUtils.par_from_endf(isotopes, emin=1., emax=50., cache_dir=tmp_path / "cache")
+    assert list(pars) == isotopes
+    for isotope, parfile in pars.items():
+        name = isotope.replace("-", "")
+        assert parfile == pathlib.Path(f"archive/{name}/results/{name}.par")
+        assert parfile.exists()
+        # the input file is generated inside the run directory
+        assert pathlib.Path(f"archive/{name}/{name}.inp").exists()
+    assert len(log.read_text().splitlines()) == 3
+
+    # the second call is served from the cache
+    for parfile in pars.values():
+        parfile.unlink()
+    sammyUtils.par_from_endf(isotopes, emin=1., emax=50., cache_dir=tmp_path / "cache")
+    assert all(parfile.exists() for parfile in pars.values())
+    assert len(log.read_text().splitlines()) == 3
+
+    # a different energy window is a miss
+    sammyUtils.par_from_endf(["Eu-151"], emin=1., emax=100., cache_dir=tmp_path / "cache")
+    assert len(log.read_text().splitlines()) == 4
+
+    # the cache is bounded
+    sammyUtils.par_from_endf(["U-238"], emin=1., emax=100., cache_dir=tmp_path / "small", cache_max_bytes=1)
+    assert sammyRunner.ResultCache(tmp_path / "small").entries() == []
+
+def test_par_from_endf_library_key(fake_sammy, endf_tape, tmp_path, monkeypatch):
+    from pleiades import endfData
+    monkeypatch.setattr(endfData, "ENDF_FILE", endf_tape)
+    log = tmp_path / "calls.log"
+    monkeypatch.setenv("FAKE_SAMMY_LOG", str(log))
+
+    sammyUtils.par_from_endf(["Eu-151"], emin=1., emax=50., cache_dir=tmp_path / "cache")
+    assert len(log.read_text().splitlines()) == 1
+
+    # editing another material of the library keeps the entry, editing the material of the isotope does not
+    endf_tape.write_text(endf_tape.read_text().replace(" 9237 resonances", " 9237 revised   "))
+    sammyUtils.par_from_endf(["Eu-151"], emin=1., emax=50., cache_dir=tmp_path / "cache")
+    assert len(log.read_text().splitlines()) == 1
+
+    endf_tape.write_text(endf_tape.read_text().replace(" 6325 resonances", " 6325 revised   "))
+    sammyUtils.par_from_endf(["Eu-151"], emin=1., emax=50., cache_dir=tmp_path / "cache")
+    assert len(log.read_text().splitlines()) == 2
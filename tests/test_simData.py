@@ -0,0 +1,286 @@
+from pleiades import simData
+from numpy import testing
+import numpy as np
+import pytest
+import pathlib
+import os
+
+XS_FILE = pathlib.Path(__file__).parent.parent / "nucDataLibs/xSections/au-n.tot"
+
+@pytest.fixture
+def gold():
+    isotope = simData.Isotope("Au-197", 196.9666, 0.01, "cm", 1., str(XS_FILE), 19.3, "g/cm3")
+    isotope.load_xs_data()
+    return isotope
+
+def test_areal_density(gold):
+    testing.assert_almost_equal(simData.areal_density(gold), 0.01*19.3*simData.AVOGADRO/196.9666/simData.CM2_TO_BARN)
+
+    gold.thickness, gold.thickness_unit = 0.1, "mm"
+    testing.assert_almost_equal(simData.areal_density(gold), 0.01*19.3*simData.AVOGADRO/196.9666/simData.CM2_TO_BARN)
+
+    gold.abundance = 0.5
+    testing.assert_almost_equal(simData.areal_density(gold), 0.005*19.3*simData.AVOGADRO/196.9666/simData.CM2_TO_BARN)
+    # a missing abundance means the pure isotope
+    assert simData.Isotope().abundance == 1.
+
+    gold.thickness_unit = "inch"
+    with pytest.raises(ValueError):
+        simData.areal_density(gold)
+
+def test_calculate_transmission(gold):
+    energy_grid = np.linspace(1, 100, 1000)
+    transmission = simData.calculate_transmission(energy_grid, gold)
+    assert isinstance(transmission, np.ndarray)
+    assert transmission.shape == energy_grid.shape
+    assert np.all((transmission >= 0) & (transmission <= 1))
+
+    # the tuple-list shim returns the same values
+    energies, values = zip(*simData.create_transmission(energy_grid, gold))
+    testing.assert_array_equal(energies, energy_grid)
+    testing.assert_array_equal(values, transmission)
+
+def test_calculate_transmission_matrix(gold):
+    energy_grid = np.linspace(1, 100, 1000)
+    tantalum = simData.Isotope("Ta-181", 180.948, 0.01, "cm", 0.5, str(XS_FILE.with_name("ta-n.tot")), 16.65, "g/cm3")
+    tantalum.load_xs_data()
+
+    transmissions, combined = simData.calculate_transmission_matrix(energy_grid, [gold, tantalum])
+    assert transmissions.shape == (2, len(energy_grid))
+
+    # the abundance scales the areal density in both APIs, so they agree for any abundance
+    testing.assert_allclose(transmissions[0], simData.calculate_transmission(energy_grid, gold))
+    testing.assert_allclose(transmissions[1], simData.calculate_transmission(energy_grid, tantalum))
+    testing.assert_allclose(simData.calculate_attenuation(energy_grid, [tantalum])[0],
+                            -np.log(simData.calculate_transmission(energy_grid, tantalum)))
+    tantalum.abundance = 1.
+    testing.assert_allclose(np.log(transmissions[1]), 0.5*np.log(simData.calculate_transmission(energy_grid, tantalum)))
+    testing.assert_allclose(combined, np.prod(transmissions, axis=0))
+
+def test_read_xs_file(tmp_path):
+    import shutil
+    xs_file = shutil.copy(XS_FILE, tmp_path / "au-n.tot")
+    cache_file = tmp_path / "au-n.tot.AU-197.npy"
+
+    xs_data = simData.read_xs_file(xs_file, "Au-197")
+    assert xs_data.shape == (31699, 2)
+    testing.assert_equal(xs_data[0], [1e-11*1E6, 4952.17])
+    assert cache_file.exists()
+
+    # the cached array is returned on the next read
+    testing.assert_array_equal(simData.read_xs_file(xs_file, "Au-197"), xs_data)
+    testing.assert_equal(simData.parse_xs_file(xs_file, "Au-197")[0], (1e-11*1E6, 4952.17))
+
+    # a replaced file with an older modification time (e.g. cp -p) is not served from the stale sidecar
+    import os
+    text = open(xs_file).read()
+    open(xs_file, "w").write(text.replace("4952.17", "5952.17", 1))
+    os.utime(xs_file, ns=(1, 1))
+    assert simData.read_xs_file(xs_file, "Au-197")[0, 1] == 5952.17
+
+    with pytest.raises(ValueError):
+        simData.read_xs_file(xs_file, "U-238")
+
+def test_xs_library(gold):
+    other = simData.Isotope("Au-197", xs_file_location=str(XS_FILE))
+    other.load_xs_data()
+    # isotopes referencing the same file share one read-only array
+    assert other.xs_data is gold.xs_data
+    assert not other.xs_data.flags.writeable
+
+    library = simData.XSLibrary(memory_budget=gold.xs_data.nbytes)
+    library.get(XS_FILE, "Au-197")
+    library.get(XS_FILE.with_name("ta-n.tot"), "Ta-181")
+    # the least recently used array is evicted once the budget is exceeded
+    assert len(library) == 1
+    assert library.nbytes <= gold.xs_data.nbytes
+
+def test_calculate_transmission_sweep(gold):
+    energy_grid = np.linspace(1, 100, 1000)
+    thicknesses = np.array([0.005, 0.01, 0.02])
+
+    sweep = simData.calculate_transmission_sweep(energy_grid, gold, thicknesses=thicknesses)
+    assert sweep.shape == (3, len(energy_grid))
+    testing.assert_allclose(sweep[1], simData.calculate_transmission(energy_grid, gold))
+
+    areal_densities = thicknesses * 19.3 * simData.AVOGADRO / 196.9666 / simData.CM2_TO_BARN
+    testing.assert_allclose(simData.calculate_transmission_sweep(energy_grid, gold, areal_densities=areal_densities), sweep)
+
+    # thickness x density grid
+    grid = simData.calculate_transmission_sweep(energy_grid, gold, thicknesses=thicknesses[:, None], densities=[19.3, 10.])
+    assert grid.shape == (3, 2, len(energy_grid))
+    testing.assert_allclose(grid[:, 0], sweep)
+
+    with pytest.raises(ValueError):
+        simData.calculate_transmission_sweep(energy_grid, gold)
+
+    # abundance and thickness unit are applied as in the matrix engine
+    gold.thickness, gold.thickness_unit, gold.abundance = 0.1, "mm", 0.5
+    sweep = simData.calculate_transmission_sweep(energy_grid, gold, thicknesses=[0.05, 0.1])
+    testing.assert_allclose(sweep[1], simData.calculate_transmission_matrix(energy_grid, [gold])[1])
+    testing.assert_allclose(sweep[1], simData.calculate_transmission(energy_grid, gold))
+    # explicit areal densities are not scaled again
+    explicit = simData.calculate_transmission_sweep(energy_grid, gold, areal_densities=[simData.areal_density(gold)])
+    testing.assert_allclose(explicit[0], simData.calculate_transmission(energy_grid, gold))
+
+    gold.thickness_unit = "atoms/cm2"
+    with pytest.raises(ValueError):
+        simData.calculate_transmission_sweep(energy_grid, gold, thicknesses=thicknesses)
+
+def test_broadening(gold):
+    energy_grid = np.linspace(1, 100, 20000)
+    transmission = simData.calculate_transmission(energy_grid, gold)
+    _, doppler = simData.calculate_transmission_matrix(energy_grid, [gold], temperature=296.)
+
+    # broadening fills the resonance dips and keeps flat spectra flat
+    resonance = np.argmin(transmission)
+    assert doppler[resonance] > transmission[resonance]
+    testing.assert_allclose(simData.doppler_broaden(energy_grid, np.full_like(energy_grid, 5.), 296., 196.9666), 5.)
+
+    broadened = simData.resolution_broaden(energy_grid, doppler, 10.7, flight_path_spread=0.01, deltag_fwhm=0.5, deltae_us=0.3)
+    assert broadened.shape == energy_grid.shape
+    assert broadened[resonance] > doppler[resonance]
+    testing.assert_allclose(simData.resolution_broaden(energy_grid, np.full_like(energy_grid, 0.7), 10.7, 0.01, 0.5, 0.3), 0.7)
+
+def test_resolution_broaden_direct():
+    from pleiades.sammyUtils import time2energy
+    # a resonance dip on a uniform time-of-flight grid, compared away from the edges with a direct convolution
+    tof = np.linspace(50, 150, 2001)
+    energy_grid = time2energy(tof*1E-6, 10.72)
+    transmission = 1 - 0.8*np.exp(-((tof - 100)/0.5)**2)
+    inner = slice(200, -200)
+
+    sigma = 0.3 / (2*np.sqrt(2*np.log(2)))
+    kernel = np.exp(-0.5*((tof[:, None] - tof[None, :])/sigma)**2)
+    broadened = simData.resolution_broaden(energy_grid, transmission, 10.72, deltag_fwhm=0.3)
+    testing.assert_allclose(broadened[inner], (kernel @ transmission / kernel.sum(axis=1))[inner], atol=3E-3)
+    assert np.abs(broadened - transmission).max() > 0.04
+
+    # the flight-path spread is a Gaussian in log(TOF), the samples are weighted by their log(TOF) spacing
+    log_tof = np.log(tof)
+    kernel = np.exp(-0.5*((log_tof[:, None] - log_tof[None, :])/(0.01/10.72))**2) / tof
+    broadened = simData.resolution_broaden(energy_grid, transmission, 10.72, flight_path_spread=0.01)
+    testing.assert_allclose(broadened[inner], (kernel @ transmission / kernel.sum(axis=1))[inner], atol=3E-3)
+
+    # the normalized kernels, exponential tail included, conserve the area of the dip
+    broadened = simData.resolution_broaden(energy_grid, transmission, 10.72, 0.01, 0.3, 0.4)
+    testing.assert_allclose(np.sum(1 - broadened), np.sum(1 - transmission), rtol=1E-4)
+
+    # a smooth spectrum barely changes
+    energy_grid = np.linspace(1, 1000, 100000)
+    testing.assert_allclose(simData.resolution_broaden(energy_grid, np.exp(-1/energy_grid), 10.72, 0.01, 0.5, 0.2),
+                            np.exp(-1/energy_grid), atol=1E-3)
+
+@pytest.mark.skipif(not os.environ.get("PLEIADES_BENCHMARK"), reason="set PLEIADES_BENCHMARK=1 to run the benchmarks")
+def test_resolution_broaden_scaling():
+    import time
+
+    def timed(points):
+        energy_grid = np.linspace(1, 1000, points)
+        transmission = np.exp(-1/energy_grid)
+        simData.resolution_broaden(energy_grid, transmission, 10.72, 0.01, 0.5, 0.2)
+        start = time.perf_counter()
+        simData.resolution_broaden(energy_grid, transmission, 10.72, 0.01, 0.5, 0.2)
+        return time.perf_counter() - start
+
+    # the uniform grid mappings are reused, the cost grows about linearly with the grid size
+    assert timed(1000000) < 30 * timed(100000) + 0.05
+
+def test_adaptive_energy_grid(gold):
+    grid = simData.adaptive_energy_grid(1, 100, [gold], tolerance=1E-3)
+    assert np.all(np.diff(grid) > 0)
+    testing.assert_equal(grid[[0, -1]], [1, 100])
+
+    # the adaptive grid reproduces the transmission of a much finer grid
+    fine_grid = np.geomspace(1, 100, 200000)
+    _, fine = simData.calculate_transmission_matrix(fine_grid, [gold])
+    _, coarse = simData.calculate_transmission_matrix(grid, [gold])
+    assert len(grid) < len(fine_grid) / 10
+    assert np.abs(np.interp(fine_grid, grid, coarse) - fine).max() < 2E-3
+
+def test_adaptive_energy_grid_parfile():
+    from pleiades import sammyParFile
+
+    par = sammyParFile.ParFile(pathlib.Path(__file__).parent / "files/Eu_151.par", name="none").read()
+    grid = simData.adaptive_energy_grid(1, 100, parfile=par, reference_points=100000)
+    assert len(grid) < 100000 / 10
+    # the points are clustered around the resonances
+    assert np.sum(np.abs(grid - 1.815) < 0.05) > np.sum(np.abs(grid - 1.6) < 0.05)
+
+def test_write_transmission_data(tmp_path):
+    energy = np.linspace(1, 100, 10)
+    transmission = np.exp(-energy/50)
+
+    output_file = tmp_path / "transmission.twenty"
+    simData.write_transmission_data(energy, transmission, output_file, include_error=True)
+    lines = open(output_file).read().splitlines()
+    assert len(lines) == 10
+    assert all(len(line) == 60 for line in lines)
+    testing.assert_allclose(np.loadtxt(output_file), np.column_stack([energy, transmission, np.full(10, 0.1)]), atol=1E-12)
+
+def test_write_twenty_MeV(tmp_path):
+    from pleiades import sammyData
+
+    # MeV energies and negative values keep the twenty character columns
+    energy = np.array([1.5e6, 2e7, 1e3, 0.5])
+    data = np.array([0.5, -2e5, 1., 0.])
+    output_file = sammyData.write_twenty(tmp_path / "MeV.twenty", energy, data, np.full(4, 0.1))
+    lines = output_file.read_text().splitlines()
+    assert all(len(line) == 60 for line in lines)
+    testing.assert_allclose(np.loadtxt(output_file), np.column_stack([energy, data, np.full(4, 0.1)]), rtol=1E-12)
+
+def test_simulate_counts(tmp_path):
+    energy = np.linspace(1, 100, 500)
+    transmission = np.exp(-energy/50)
+    open_beam = np.full_like(energy, 1000.)
+
+    chunks = list(simData.simulate_counts(energy, transmission, open_beam, 10.7, realizations=250, chunk_size=100, seed=1))
+    testing.assert_equal([len(chunk[1]) for chunk in chunks], [100, 100, 50])
+    tof, sample, open_beam_counts = chunks[0]
+    assert sample.shape == open_beam_counts.shape == (100, 500)
+    assert np.all(np.diff(tof) < 0) # higher energies arrive first
+    testing.assert_allclose(sample.mean(axis=0), 1000*transmission, rtol=0.15)
+
+    tof_file, sample_file, open_beam_file = simData.write_counts(tmp_path / "synthetic", energy, transmission, open_beam, 10.7,
+                                                                  realizations=250, chunk_size=100, seed=1)
+    stored = np.load(sample_file, mmap_mode="r")
+    assert stored.shape == (250, 500)
+    testing.assert_array_equal(stored[:100], sample)
+    testing.assert_array_equal(np.load(tof_file), tof)
+
+def test_simulate_configs(tmp_path, gold):
+    import shutil
+    xs_file = shutil.copy(XS_FILE, tmp_path / "au-n.tot")
+    config_file = tmp_path / "gold.ini"
+    config_file.write_text(f"[Gold]\nname = Au-197\nthickness = 0.01\nthickness_unit = cm\nabundance = 1.0\n"
+                           f"xs_file_location = {xs_file}\ndensity = 19.3\ndensity_unit = g/cm3\n")
+    thin = simData.Isotope("Au-197", 196.9666, 0.005, "cm", 1., str(xs_file), 19.3, "g/cm3")
+
+    energy_grid = np.linspace(1, 100, 500)
+    transmissions = simData.simulate_configs([config_file, [thin]], energy_grid, max_workers=2, output_file=tmp_path / "doe.npy")
+    assert transmissions.shape == (2, 500)
+    testing.assert_allclose(transmissions[0], simData.calculate_transmission(energy_grid, gold), rtol=1e-4)
+    testing.assert_allclose(transmissions[1]**2, transmissions[0], rtol=1e-4)
+    testing.assert_array_equal(np.load(tmp_path / "doe.npy"), transmissions)
+    # the caller's isotopes keep their state, the workers share the sidecar
+    assert len(thin.xs_data) == 0
+    assert (tmp_path / "au-n.tot.AU-197.npy").exists()
+
+def test_binary_transmission_data(tmp_path):
+    from pleiades import sammyData
+    energy = np.linspace(1, 100, 10)
+    transmission = np.exp(-energy/50)
+
+    simData.write_transmission_data(energy, transmission, tmp_path / "transmission.twenty", include_error=True)
+    simData.write_transmission_data(energy, transmission, tmp_path / "transmission.twenty", include_error=True, binary=True)
+
+    spectrum, metadata = sammyData.load_spectrum(tmp_path / "transmission.npy")
+    assert isinstance(spectrum, np.memmap)
+    testing.assert_array_equal(spectrum["energy"], energy)
+    testing.assert_array_equal(spectrum["uncertainty"], 0.1)
+    assert np.isnan(spectrum["tof"]).all()
+    assert metadata["points"] == 10 and metadata["source"] == "simData"
+
+    # the conversion at staging time reproduces the twenty format file
+    sammyData.spectrum_to_twenty(tmp_path / "transmission.npy", tmp_path / "staged.dat")
+    assert (tmp_path / "staged.dat").read_text() == (tmp_path / "transmission.twenty").read_text()